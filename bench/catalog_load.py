@@ -0,0 +1,156 @@
+"""
+/with-menus 的資料讀取：舊的 joinedload ORM 查詢 vs 只撈欄位的 select()，在 1k / 10k / 100k 道菜下比較。
+
+    python bench/catalog_load.py --database-url postgresql+psycopg2://postgres@localhost/bench \
+        --dishes 1000,10000,100000 --output catalog.json
+
+每個情境回報 rows_per_s (每秒菜色數)、回應 byte 數，以及資料庫回傳的 byte 數 (經過計數 proxy 量測)。
+每個資料量都會清空目標資料庫的 public schema，只能對測試用資料庫使用。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from micro import measure  # noqa: E402
+from run import _proxied_url, git_commit, seed_catalog  # noqa: E402
+
+
+def _joinedload_restaurants():
+    """user-003 之前 /with-menus 的查詢與組裝方式"""
+    from sqlalchemy.orm import joinedload
+    from models import db, Restaurant
+
+    restaurants = db.session.query(Restaurant).options(joinedload(Restaurant.restaurant_menu)).all()
+    data = [
+        {
+            "id": str(r.id),
+            "restaurant_name": r.restaurant_name,
+            "image_key": r.image_key,
+            "created_at": str(r.created_at) if r.created_at else None,
+            "updated_at": str(r.updated_at) if r.updated_at else None,
+            "menus": [
+                {
+                    "id": str(m.id),
+                    "restaurant_id": str(r.id),
+                    "image_key": m.image_key,
+                    "dish_name": m.dish_name,
+                    "cuisine": m.cuisine,
+                    "menu_category": m.menu_category,
+                    "price": m.price,
+                }
+                for m in (r.restaurant_menu or [])
+            ],
+        }
+        for r in restaurants
+    ]
+    return {"restaurants": data, "count": len(data)}
+
+
+def _projected_restaurants():
+    from catalog import fetch_restaurants_with_menus
+    from schemas import serialize_restaurants
+
+    views = fetch_restaurants_with_menus()
+    return {**serialize_restaurants(views, False, False, with_menus=True), "count": len(views)}
+
+
+STRATEGIES = {"joinedload": _joinedload_restaurants, "projection": _projected_restaurants}
+
+
+def bench_size(app, engine, traffic: dict, dishes: int, menus: int, repeat: int) -> dict:
+    from flask import current_app
+    from sqlalchemy import text
+    from models import db
+
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE restaurant CASCADE"))
+        seed_catalog(conn, max(1, dishes // menus), menus)
+        rows = conn.execute(text("SELECT count(*) FROM restaurant_menu")).scalar()
+
+    results = {}
+    with app.app_context():
+        for name, load in STRATEGIES.items():
+            def respond():
+                try:
+                    return current_app.json.response(
+                        {"msg": "Restaurants with menus retrieved successfully", **load()}
+                    ).get_data()
+                finally:
+                    # 不讓 identity map 留到下一輪
+                    db.session.remove()
+
+            result = measure(respond, repeat, rows)
+            received, sent = traffic["received"], traffic["sent"]
+            body = respond()
+            result["rows"] = rows
+            result["rows_per_s"] = result["ops_per_s"]
+            result["response_bytes"] = len(body)
+            result["db_bytes_received"] = traffic["received"] - received
+            result["db_bytes_sent"] = traffic["sent"] - sent
+            results[f"with-menus.{name}.{dishes}"] = result
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="SQLAlchemy URL of a disposable database (or BENCH_DATABASE_URL)")
+    parser.add_argument("--dishes", default="1000,10000,100000", help="catalog sizes, comma separated")
+    parser.add_argument("--menus", type=int, default=20, help="dishes per restaurant")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url or BENCH_DATABASE_URL is required")
+
+    from sqlalchemy import create_engine, text
+
+    # app 的連線經過計數 proxy (不加延遲)；灌資料直接連資料庫
+    traffic = {}
+    os.environ.update({
+        "SUPABASE_URL": _proxied_url(args.database_url, 0, traffic),
+        "JWT_SECRET": "bench-jwt-secret-key-0123456789abcdef",
+        "SECRET_KEY": "bench",
+        "METRICS_DIR": tempfile.mkdtemp(prefix="bench-metrics-"),
+        "SCHEMA_CREATE_ON_STARTUP": "true",
+    })
+    engine = create_engine(args.database_url)
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public;"))
+    from app import create_app
+
+    app = create_app()
+
+    results = {}
+    for dishes in (int(n) for n in args.dishes.split(",")):
+        results.update(bench_size(app, engine, traffic, dishes, args.menus, args.repeat))
+    engine.dispose()
+
+    for name, r in results.items():
+        print(f"{name:32s} {r['rows_per_s']:12.1f} rows/s  p50 {r['p50_ms']} ms  "
+              f"response {r['response_bytes']} B  db {r['db_bytes_received']} B", file=sys.stderr)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("database_url", "output")},
+        "results": results,
+    }
+    text_report = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text_report + "\n")
+    else:
+        print(text_report)
+
+
+if __name__ == "__main__":
+    main()
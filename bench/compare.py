@@ -0,0 +1,68 @@
+"""
+比較兩份 run.py / micro.py / startup.py 的 JSON 結果：
+
+    python bench/compare.py before.json after.json --fail-on-regression 10
+
+吞吐量下降或 p99 上升超過門檻 (百分比) 時以 exit code 1 結束，方便放進 CI。
+"""
+import argparse
+import json
+import sys
+
+
+def _throughput(result: dict):
+    return result.get("rps", result.get("ops_per_s"))
+
+
+def _change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def _value(value):
+    # startup.py 的結果沒有吞吐量
+    return "-" if value is None else value
+
+
+def _pct(value) -> str:
+    return "n/a" if value is None else f"{value:+.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--fail-on-regression", type=float, metavar="PERCENT")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline.get('commit')}  {baseline.get('timestamp')}")
+    print(f"candidate {candidate.get('commit')}  {candidate.get('timestamp')}")
+    print(f"{'name':24s} {'throughput':>22s} {'change':>8s} {'p95 ms':>20s} {'p99 ms':>20s} {'change':>8s}")
+    regressions = []
+    for name, old in baseline["results"].items():
+        new = candidate["results"].get(name)
+        if new is None:
+            continue
+        tput = _change(_throughput(old), _throughput(new))
+        p99 = _change(old.get("p99_ms"), new.get("p99_ms"))
+        print(f"{name:24s} {_value(_throughput(old)):>10} -> {_value(_throughput(new)):<10} "
+              f"{_pct(tput):>8} {_value(old.get('p95_ms')):>8} -> {_value(new.get('p95_ms')):<8} "
+              f"{_value(old.get('p99_ms')):>8} -> {_value(new.get('p99_ms')):<8} {_pct(p99):>8}")
+        limit = args.fail_on_regression
+        if limit is not None and ((tput is not None and tput < -limit)
+                                  or (p99 is not None and p99 > limit)):
+            regressions.append(name)
+    if regressions:
+        print(f"regressions beyond {args.fail_on_regression}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
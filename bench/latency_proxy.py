@@ -0,0 +1,53 @@
+"""在 benchmark 與 Postgres 之間加上固定延遲的 TCP proxy，模擬連到 Supabase 的網路往返"""
+import asyncio
+import threading
+
+
+async def _pipe(reader, writer, delay: float, traffic: dict | None = None, direction: str = ""):
+    try:
+        while data := await reader.read(65536):
+            if traffic is not None:
+                traffic[direction] += len(data)
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def start_latency_proxy(target: tuple[str, int] | str, rtt_ms: float, port: int = 0,
+                        traffic: dict | None = None) -> int:
+    """target 為 (host, port) 或 unix socket 路徑；回傳 proxy 監聽的本機 port
+
+    traffic 不是 None 時累計經過的 byte 數："sent" 為送往資料庫、"received" 為資料庫回傳
+    """
+    if traffic is not None:
+        traffic.setdefault("sent", 0)
+        traffic.setdefault("received", 0)
+    delay = rtt_ms / 2000  # 每個方向各一半
+    ready = threading.Event()
+    bound = {}
+
+    async def handle(client_reader, client_writer):
+        if isinstance(target, str):
+            server_reader, server_writer = await asyncio.open_unix_connection(target)
+        else:
+            server_reader, server_writer = await asyncio.open_connection(*target)
+        await asyncio.gather(
+            _pipe(client_reader, server_writer, delay, traffic, "sent"),
+            _pipe(server_reader, client_writer, delay, traffic, "received"),
+        )
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", port)
+        bound["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(main()), name="latency-proxy", daemon=True).start()
+    ready.wait()
+    return bound["port"]
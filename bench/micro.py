@@ -0,0 +1,138 @@
+"""
+不需要資料庫的微基準：presign (boto3 vs 本地 SigV4) 與 /with-menus 回應的 JSON 編碼 (stdlib / orjson / msgspec)。
+
+    python bench/micro.py --output micro.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from run import git_commit  # noqa: E402
+
+ENDPOINT = "https://account.r2.cloudflarestorage.com"
+ACCESS_KEY, SECRET_KEY, BUCKET = "bench-access-key", "bench-secret-key", "bench"
+
+
+def measure(fn, repeat: int, ops_per_call: int = 1) -> dict:
+    fn()  # 暖機 (建立快取、載入模型)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    total = sum(samples)
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3)
+
+    return {
+        "calls": repeat,
+        "ops_per_s": round(repeat * ops_per_call / total, 1),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def bench_presign(keys: int, repeat: int) -> dict:
+    import boto3
+    from presign import SigV4Presigner
+
+    names = [f"bench/{i}.jpg" for i in range(keys)]
+    client = boto3.client("s3", endpoint_url=ENDPOINT, aws_access_key_id=ACCESS_KEY,
+                          aws_secret_access_key=SECRET_KEY, region_name="auto")
+    presigner = SigV4Presigner(ACCESS_KEY, SECRET_KEY, ENDPOINT, BUCKET, "auto")
+    return {
+        "presign.boto3": measure(lambda: [client.generate_presigned_url(
+            "get_object", Params={"Bucket": BUCKET, "Key": k}, ExpiresIn=900) for k in names],
+            repeat, keys),
+        "presign.sigv4": measure(lambda: presigner.presign_many("GET", names, 900), repeat, keys),
+    }
+
+
+def bench_json(dishes: int, menus: int, repeat: int) -> dict:
+    """/with-menus 的回應編碼；後端由 make_json_provider 選擇，與 app 實際使用的相同"""
+    from flask import Flask
+    from json_provider import make_json_provider, msgspec, orjson
+    from schemas import MenuView, RestaurantView, serialize_restaurants
+
+    now = datetime.now(timezone.utc)
+    views = []
+    for r in range(max(1, dishes // menus)):
+        restaurant_id = uuid.uuid4()
+        views.append(RestaurantView(
+            SimpleNamespace(id=restaurant_id, restaurant_name=f"Restaurant {r}", image_key=f"bench/r{r}.jpg",
+                            created_at=now, updated_at=now),
+            [MenuView(SimpleNamespace(
+                id=uuid.uuid4(), restaurant_id=restaurant_id, image_key=f"bench/{r}-{i}.jpg",
+                dish_name=f"Dish {i}", cuisine="tw", menu_category="main", price=Decimal(i % 1000),
+            )) for i in range(menus)],
+        ))
+    app = Flask("bench")
+    backends = ["stdlib"]
+    if orjson is not None:
+        backends.append("orjson")
+    if msgspec is not None:
+        backends.append("msgspec")
+    results = {}
+    with app.app_context():
+        for compact in (False, True):
+            payload = {
+                "msg": "Restaurants with menus retrieved successfully",
+                **serialize_restaurants(views, compact, False, with_menus=True),
+                "count": len(views),
+            }
+            for name in backends:
+                provider = make_json_provider(app, name)
+                label = f"json.{name}" + (".compact" if compact else "")
+                # 與 jsonify 相同的路徑：fast provider 直接輸出 bytes
+                results[label] = measure(lambda: provider.response(payload).get_data(), repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--presign-keys", type=int, default=100)
+    parser.add_argument("--dishes", type=int, default=10000)
+    parser.add_argument("--menus", type=int, default=20, help="dishes per restaurant")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+
+    results = {}
+    results.update(bench_presign(args.presign_keys, args.repeat))
+    results.update(bench_json(args.dishes, args.menus, args.repeat))
+    for name, r in results.items():
+        print(f"{name:24s} {r['ops_per_s']:12.1f} ops/s  p50 {r['p50_ms']} ms  p99 {r['p99_ms']} ms",
+              file=sys.stderr)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": vars(args),
+        "results": results,
+    }
+    text_report = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text_report + "\n")
+    else:
+        print(text_report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+對本機 Postgres 啟動 create_app()，灌入指定大小的目錄資料，以固定並行數壓測主要 API。
+
+    python bench/run.py --database-url postgresql+psycopg2://postgres@localhost/bench --reset \
+        --restaurants 1000 --menus 20 --concurrency 32 --duration 10 --output before.json
+    python bench/compare.py before.json after.json
+
+R2 指向行程內的 S3 替身 (s3stub.py)；--db-latency-ms 透過 latency_proxy.py 模擬 Supabase 的網路往返。
+--reset 會清空目標資料庫的 public schema，只能對測試用資料庫使用。
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+sys.path.insert(0, SRC_DIR)
+
+from latency_proxy import start_latency_proxy  # noqa: E402
+from s3stub import start_s3_stub  # noqa: E402
+
+SCENARIOS = ("login", "all", "with-menus", "menu-get", "search", "menu-add", "presign")
+BENCH_USER = {"username": "bench", "email": "bench@example.com", "password": "bench-password"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="SQLAlchemy URL of a disposable database (or BENCH_DATABASE_URL)")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate the public schema first")
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--menus", type=int, default=20, help="dishes per restaurant")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds measured per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--presign-batch", type=int, default=20, help="keys per presign request")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="simulated DB round trip")
+    parser.add_argument("--server", choices=("werkzeug", "gunicorn"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra app config, e.g. RESPONSE_CACHE_BACKEND=none")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url or BENCH_DATABASE_URL is required")
+    return args
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _proxied_url(url: str, rtt_ms: float, traffic: dict | None = None) -> str:
+    """把 URL 改成經過延遲 proxy；unix socket (host=/dir) 與 TCP 都支援"""
+    from sqlalchemy.engine import make_url
+
+    parsed = make_url(url)
+    socket_dir = parsed.query.get("host")
+    if socket_dir or not parsed.host:
+        target = os.path.join(socket_dir or "/var/run/postgresql", f".s.PGSQL.{parsed.port or 5432}")
+    else:
+        target = (parsed.host, parsed.port or 5432)
+    port = start_latency_proxy(target, rtt_ms, traffic=traffic)
+    proxied = parsed.set(host="127.0.0.1", port=port).difference_update_query(["host"])
+    return proxied.render_as_string(hide_password=False)
+
+
+def configure_env(args) -> dict:
+    s3 = start_s3_stub()
+    env = {
+        "SUPABASE_URL": args.database_url,
+        "JWT_SECRET": "bench-jwt-secret-key-0123456789abcdef",
+        "SECRET_KEY": "bench",
+        "R2_ACCESS_KEY_ID": "bench-access-key",
+        "R2_SECRET_ACCESS_KEY": "bench-secret-key",
+        "R2_ENDPOINT_URL": "http://%s:%d" % s3.server_address,
+        "R2_BUCKET_NAME": "bench",
+        "METRICS_DIR": tempfile.mkdtemp(prefix="bench-metrics-"),
+        "GUNICORN_WORKER_CLASS": args.worker_class,
+        "GUNICORN_THREADS": str(args.threads),
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    if args.db_latency_ms:
+        env["SUPABASE_URL"] = _proxied_url(args.database_url, args.db_latency_ms)
+    os.environ.update(env)
+    return env
+
+
+def seed_catalog(conn, restaurants: int, menus: int) -> None:
+    """補足到 restaurants 家餐廳，新餐廳各 menus 道菜"""
+    from sqlalchemy import text
+
+    existing = conn.execute(text("SELECT count(*) FROM restaurant")).scalar()
+    if existing < restaurants:
+        conn.execute(text(
+            "INSERT INTO restaurant (restaurant_name) "
+            "SELECT 'Bench restaurant ' || g FROM generate_series(:start, :stop) g"
+        ), {"start": existing + 1, "stop": restaurants})
+        conn.execute(text("""
+            INSERT INTO restaurant_menu (restaurant_id, dish_name, cuisine, menu_category,
+                                         price, rating, image_key)
+            SELECT r.id,
+                   (ARRAY['Beef noodle','Braised pork rice','Ramen','Sushi roll','Pad thai',
+                          'Fried rice','Dumpling','Curry'])[1 + (g % 8)] || ' ' || g,
+                   (ARRAY['tw','jp','th','us','it'])[1 + (g % 5)],
+                   (ARRAY['main','side','drink','dessert'])[1 + (g % 4)],
+                   (g * 37) % 1000, ((g % 50) / 10.0)::numeric(2,1),
+                   'bench/' || r.id || '/' || g || '.jpg'
+            FROM (SELECT id FROM restaurant ORDER BY created_at DESC LIMIT :new) r,
+                 generate_series(1, :menus) g
+        """), {"new": restaurants - existing, "menus": menus})
+    conn.execute(text("ANALYZE"))
+
+
+def prepare_database(args):
+    """建立資料表並以 generate_series 灌資料；直接連資料庫，不經過延遲 proxy"""
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(args.database_url)
+    with engine.begin() as conn:
+        if args.reset:
+            conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public;"))
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    with engine.begin() as conn:
+        seed_catalog(conn, args.restaurants, args.menus)
+        ids = [str(row[0]) for row in conn.execute(text("SELECT id FROM restaurant"))]
+    engine.dispose()
+    return app, ids
+
+
+class Server:
+    def __init__(self, args, app, env):
+        self.port = _free_port()
+        self.proc = None
+        if args.server == "werkzeug":
+            from werkzeug.serving import make_server
+
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+            self.httpd = make_server("127.0.0.1", self.port, app, threaded=True)
+            threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        else:
+            cmd = [sys.executable, "-m", "gunicorn", "--chdir", SRC_DIR,
+                   "-w", str(args.workers), "-k", args.worker_class, "--threads", str(args.threads),
+                   "--worker-connections", str(max(1000, args.concurrency * 2)),
+                   "--backlog", str(max(2048, args.concurrency * 2)),
+                   "-b", f"127.0.0.1:{self.port}", "app:create_app()"]
+            self.proc = subprocess.Popen(cmd, env={**os.environ, **env},
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_ready()
+
+    def _wait_ready(self, timeout: float = 30.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc is not None and self.proc.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("server did not start")
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait(timeout=30)
+        else:
+            self.httpd.shutdown()
+
+
+class Client:
+    """單一 keep-alive 連線；cookie 取自登入時的 Set-Cookie"""
+
+    def __init__(self, port: int, cookies: dict | None = None):
+        self.port = port
+        self.cookies = dict(cookies or {})
+        self.conn = None
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+            try:
+                self.conn.request(method, path, body=data, headers=headers)
+                resp = self.conn.getresponse()
+                payload = resp.read()
+                return resp, payload
+            except (ConnectionError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def remember_cookies(self, resp):
+        for header in resp.headers.get_all("Set-Cookie") or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+
+
+def login(port: int) -> Client:
+    client = Client(port)
+    client.request("POST", "/api/auth/register", BENCH_USER)  # 已存在時回 409
+    resp, payload = client.request("POST", "/api/auth/login",
+                                   {"email": BENCH_USER["email"], "password": BENCH_USER["password"]})
+    if resp.status != 200:
+        raise RuntimeError(f"login failed: {resp.status} {payload[:200]!r}")
+    client.remember_cookies(resp)
+    return client
+
+
+def build_scenarios(args, restaurant_ids: list[str], csrf: str) -> dict:
+    write_headers = {"X-CSRF-TOKEN": csrf}
+    words = ["noodle", "rice", "ramen", "sushi", "curry", "dumpling"]
+
+    def menu_add(rng):
+        body = {"dish_name": f"Bench dish {rng.random():.8f}", "cuisine": "tw",
+                "menu_category": "main", "price": rng.randrange(1000)}
+        return "POST", f"/api/restaurant-menus/add/{rng.choice(restaurant_ids)}", body, write_headers
+
+    def presign(rng):
+        files = [{"name": f"bench/{rng.randrange(10 ** 9)}.png"} for _ in range(args.presign_batch)]
+        return "POST", "/api/images/presigned/upload", {"files": files}, write_headers
+
+    return {
+        "login": lambda rng: ("POST", "/api/auth/login",
+                              {"email": BENCH_USER["email"], "password": BENCH_USER["password"]}, None),
+        "all": lambda rng: ("GET", "/api/restaurant/all?limit=50", None, None),
+        "with-menus": lambda rng: ("GET", "/api/restaurant/with-menus", None, None),
+        "menu-get": lambda rng: ("GET", f"/api/restaurant-menus/get/{rng.choice(restaurant_ids)}",
+                                 None, None),
+        "search": lambda rng: ("GET", f"/api/restaurant-menus/search?q={rng.choice(words)}&limit=20",
+                               None, None),
+        "menu-add": menu_add,
+        "presign": presign,
+    }
+
+
+def run_scenario(port: int, cookies: dict, make_request, args, seed: int) -> dict:
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(index: int, deadline: float, record: bool):
+        rng = random.Random(seed * 100003 + index)
+        client = Client(port, cookies)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            method, path, body, headers = make_request(rng)
+            started = time.perf_counter()
+            try:
+                resp, _ = client.request(method, path, body, headers)
+                ok = resp.status < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+            local.append(time.perf_counter() - started)
+            failed += not ok
+        if record:
+            with lock:
+                latencies.extend(local)
+                errors.append(failed)
+
+    for record, seconds in ((False, args.warmup), (True, args.duration)):
+        if seconds <= 0:
+            continue
+        deadline = time.perf_counter() + seconds
+        threads = [threading.Thread(target=worker, args=(i, deadline, record))
+                   for i in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "rps": round(len(latencies) / args.duration, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = configure_env(args)
+    app, restaurant_ids = prepare_database(args)
+    server = Server(args, app, env)
+    try:
+        client = login(server.port)
+        scenarios = build_scenarios(args, restaurant_ids, client.cookies.get("csrf_access_token", ""))
+        results = {}
+        for name in args.scenarios.split(","):
+            results[name] = run_scenario(server.port, client.cookies, scenarios[name], args, args.seed)
+            r = results[name]
+            print(f"{name:12s} {r['rps']:9.1f} rps  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  "
+                  f"p99 {r['p99_ms']} ms  errors {r['errors']}", file=sys.stderr)
+    finally:
+        server.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("database_url", "output")},
+        "results": results,
+    }
+    text_report = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text_report + "\n")
+    else:
+        print(text_report)
+
+
+if __name__ == "__main__":
+    main()
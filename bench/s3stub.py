@@ -0,0 +1,46 @@
+"""極簡的 S3 path-style 替身：只存在記憶體，不驗證簽章，讓 benchmark 不會打到真正的 R2"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _key(self) -> str:
+        # /<bucket>/<key>?X-Amz-...
+        return urlsplit(self.path).path.lstrip("/")
+
+    def _reply(self, status: int, body: bytes = b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.objects[self._key()] = self.rfile.read(length)
+        self.server.requests += 1
+        self._reply(200)
+
+    def do_GET(self):
+        self.server.requests += 1
+        body = self.server.objects.get(self._key())
+        self._reply(404) if body is None else self._reply(200, body)
+
+    def do_DELETE(self):
+        self.server.requests += 1
+        self.server.objects.pop(self._key(), None)
+        self._reply(204)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_s3_stub(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """背景執行緒啟動，回傳的 server.server_address 是實際的 (host, port)"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.objects = {}
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, name="s3-stub", daemon=True).start()
+    return server
@@ -0,0 +1,155 @@
+"""
+冷啟動量測：每一輪都開新的行程，量 `import app`、`create_app()`，以及 gunicorn 從啟動到回應第一個請求的時間。
+
+    python bench/startup.py --database-url postgresql+psycopg2://postgres@localhost/bench --output startup.json
+    python bench/compare.py before.json startup.json
+
+--no-bytecode-cache 忽略既有的 .pyc，重現映像沒有預先編譯時的冷啟動。
+資料表需要已經存在 (先跑過 run.py 或 `flask schema create`)；R2 金鑰是假的，不會連到外部服務。
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+sys.path.insert(0, SRC_DIR)
+
+from run import _free_port, git_commit  # noqa: E402
+
+# 子行程內執行：輸出各階段耗時 (秒)
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+json.dump({"import": imported - started, "create_app": created - imported}, sys.stdout)
+"""
+
+
+def bench_env(args) -> dict:
+    env = {
+        "SUPABASE_URL": args.database_url,
+        "JWT_SECRET": "bench-jwt-secret-key-0123456789abcdef",
+        "SECRET_KEY": "bench",
+        "R2_ACCESS_KEY_ID": "bench-access-key",
+        "R2_SECRET_ACCESS_KEY": "bench-secret-key",
+        "R2_ENDPOINT_URL": "https://account.r2.cloudflarestorage.com",
+        "R2_BUCKET_NAME": "bench",
+        "METRICS_DIR": tempfile.mkdtemp(prefix="bench-metrics-"),
+    }
+    if args.no_bytecode_cache:
+        # 模擬沒有預先編譯 .pyc 的容器：每次都從原始碼編譯
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        env["PYTHONPYCACHEPREFIX"] = tempfile.mkdtemp(prefix="bench-pycache-")
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return {**os.environ, **env}
+
+
+def probe_once(env: dict) -> dict:
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=SRC_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    timings = json.loads(out)
+    timings["process"] = time.perf_counter() - started
+    return timings
+
+
+def first_response_once(args, env: dict) -> float:
+    """從啟動 gunicorn 到第一個請求拿到完整回應；master 先綁 port，連線會排隊等 worker 載入 app"""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "--chdir", SRC_DIR, "-w", "1",
+           "-k", args.worker_class, "-b", f"127.0.0.1:{port}", "app:create_app()"]
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=args.timeout)
+            try:
+                conn.request("GET", args.path)
+                conn.getresponse().read()
+                return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+            finally:
+                conn.close()
+        raise RuntimeError("server did not respond")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def summarize(samples: list[float]) -> dict:
+    samples = sorted(samples)
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 2)
+
+    return {
+        "runs": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="SQLAlchemy URL of a database with the tables created (or BENCH_DATABASE_URL)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/api/restaurant/all", help="first request sent to the server")
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--no-bytecode-cache", action="store_true",
+                        help="ignore existing .pyc files, as in an image built without compiling bytecode")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra app config, e.g. SCHEMA_CREATE_ON_STARTUP=true")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url or BENCH_DATABASE_URL is required")
+
+    env = bench_env(args)
+    stages = {"import": [], "create_app": [], "process": [], "first_response": []}
+    for _ in range(args.runs):
+        for name, value in probe_once(env).items():
+            stages[name].append(value)
+        stages["first_response"].append(first_response_once(args, env))
+
+    results = {f"startup-{name}": summarize(samples) for name, samples in stages.items()}
+    for name, r in results.items():
+        print(f"{name:24s} mean {r['mean_ms']} ms  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms",
+              file=sys.stderr)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("database_url", "output")},
+        "results": results,
+    }
+    text_report = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text_report + "\n")
+    else:
+        print(text_report)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,18 @@ from auth import auth_bp
 from image_manager import image_bp
 from restaurant import restaurant_bp
 from restaurant_menu import restaurant_menu_bp
+from cache import response_cache
+from cli import catalog_cli, schema_cli, tokens_cli
 from config import Config
+from db_pool import pool_bp
+from green import RequestGate, patch_psycopg
+from facets import facet_refresher
+from json_provider import make_json_provider
+from metrics import install_metrics
+from passwords import password_hasher
 from models import db, TokenBlocklist
+from revocation import revocation_cache, start_revocation_listener
+from sync import sync_bp
 
 jwt = JWTManager()
 
@@ -16,17 +26,34 @@ jwt = JWTManager()
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(_jwt_header, jwt_payload: dict) -> bool:
     jti = jwt_payload["jti"]
-    return db.session.query(TokenBlocklist.id).filter_by(jti=jti).scalar() is not None
+    exp = jwt_payload.get("exp")
+    cached = revocation_cache.lookup(jti, exp)
+    if cached is not None:
+        return cached
+
+    revoked = db.session.query(TokenBlocklist.id).filter_by(jti=jti).scalar() is not None
+    revocation_cache.record_db_result(revoked)
+    if revoked:
+        revocation_cache.mark_revoked(jti, exp)
+    else:
+        revocation_cache.mark_active(jti, exp)
+    return revoked
 
 
 def create_app():
+    # gevent worker：讓資料庫等待不會卡住整個 worker
+    green = patch_psycopg()
     app = Flask(__name__)
 
     app.config.from_object(Config)
+    app.json = make_json_provider(app, app.config["JSON_BACKEND"])
 
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
+    response_cache.init_app(app)
+    password_hasher.init_app(app)
+    install_metrics(app)
     CORS(
         app,
         resources={r"/api/*": {"origins": [
@@ -43,10 +70,22 @@ def create_app():
     app.register_blueprint(image_bp)
     app.register_blueprint(restaurant_bp)
     app.register_blueprint(restaurant_menu_bp)
+    app.register_blueprint(pool_bp)
+    app.register_blueprint(sync_bp)
+    # flask tokens prune / stats
+    app.cli.add_command(tokens_cli)
+    # flask catalog import / export
+    app.cli.add_command(catalog_cli)
+    # flask schema create
+    app.cli.add_command(schema_cli)
 
-    # Create tables within application context
+    if green and app.config["GEVENT_REQUEST_LIMIT"] > 0:
+        app.wsgi_app = RequestGate(app.wsgi_app, app.config["GEVENT_REQUEST_LIMIT"])
     with app.app_context():
-        db.create_all()
+        if app.config["SCHEMA_CREATE_ON_STARTUP"]:
+            db.create_all()
+        start_revocation_listener(app, db.engine)
+        facet_refresher.start(app, db.engine)
 
     return app
 
@@ -1,6 +1,7 @@
+import time
 from datetime import datetime
 from datetime import timezone
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token
 from flask_jwt_extended import jwt_required
 from flask_jwt_extended import get_jwt_identity
@@ -9,12 +10,65 @@ from flask_jwt_extended import get_jwt
 from flask_jwt_extended import set_access_cookies
 from flask_jwt_extended import set_refresh_cookies
 from flask_jwt_extended import unset_jwt_cookies
-from sqlalchemy import or_
+from functools import wraps
+from sqlalchemy import insert, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from cache import TTLCache
 from models import db, User, TokenBlocklist
+from passwords import HashingBusy, password_hasher
+from revocation import revocation_cache, notify_payload
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
 
+# users 資料表 unique constraint 名稱 (PostgreSQL 預設命名) 對應的欄位
+_UNIQUE_FIELDS = {
+    "users_email_key": "email",
+    "users_username_key": "username",
+}
+
+# user id -> (username, role)；角色檢查不必每次查 users
+user_profile_cache = TTLCache(maxsize=10000)
+
+
+def remember_user_profile(user_id, username: str, role: str) -> None:
+    ttl = current_app.config["USER_PROFILE_CACHE_TTL"]
+    user_profile_cache.set(str(user_id), (username, role), time.time() + ttl)
+
+
+def get_user_profile(user_id) -> tuple[str, str] | None:
+    """回傳 (username, role)；快取過期才查資料庫"""
+    profile = user_profile_cache.get(str(user_id))
+    if profile is not None:
+        return profile
+    row = db.session.execute(
+        select(User.username, User.role).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    remember_user_profile(user_id, row.username, row.role)
+    return row.username, row.role
+
+
+def role_required(*roles):
+    """在 @jwt_required() 之後使用，只允許指定角色"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            profile = get_user_profile(get_jwt_identity())
+            if profile is None or profile[1] not in roles:
+                return jsonify({"msg": "Forbidden"}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _hashing_busy():
+    resp = jsonify({"msg": "Too many login attempts in progress, please retry"})
+    resp.headers["Retry-After"] = "1"
+    return resp, 503
+
+
 @auth_bp.route("/register", methods=["POST"])
 def register():
     if not request.is_json:
@@ -25,17 +79,33 @@ def register():
     email = data.get("email")
     if not username or not password or not email:
         return jsonify({"msg": "Missing username, password, or email"}), 400
-    existing = User.query.filter(
-        or_(User.email == email, User.username == username)
+    # 先用 unique index 查重複，已註冊的帳號不必付 KDF 的成本
+    existing = db.session.execute(
+        select(User.email).where(or_(User.email == email, User.username == username)).limit(1)
     ).first()
-
-    if existing:
+    # 結束唯讀交易，雜湊期間不佔連線
+    db.session.rollback()
+    if existing is not None:
         field = "email" if existing.email == email else "username"
         return jsonify(msg=f"{field} already exists"), 409
-
-    user = User(username, password, email)
-    db.session.add(user)
-    db.session.commit()
+    try:
+        password_hash = password_hasher.hash(password)
+    except (HashingBusy, TimeoutError):
+        return _hashing_busy()
+
+    # 查完到寫入之間仍可能被搶先註冊：由違反的 unique constraint 名稱判斷欄位
+    try:
+        db.session.execute(
+            insert(User).values(username=username, email=email, password_hash=password_hash, role="user")
+        )
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if getattr(e.orig, "pgcode", None) != "23505":  # unique_violation
+            raise
+        constraint = getattr(getattr(e.orig, "diag", None), "constraint_name", None)
+        field = _UNIQUE_FIELDS.get(constraint, "username or email")
+        return jsonify(msg=f"{field} already exists"), 409
     return jsonify({"msg": "User created"}), 201
 
 
@@ -48,9 +118,24 @@ def login():
     email = data.get("email")
     password = data.get("password")
 
-    user = User.query.filter_by(email=email).first()
-    if not user or not user.check_password(password):
+    if not email or not password:
+        return jsonify({"msg": "Bad username or password"}), 401
+    user = db.session.execute(
+        select(User.id, User.username, User.role, User.password_hash).where(User.email == email)
+    ).first()
+    if user is None:
         return jsonify({"msg": "Bad username or password"}), 401
+    try:
+        ok, new_hash = password_hasher.verify(user.password_hash, password)
+    except (HashingBusy, TimeoutError):
+        return _hashing_busy()
+    if not ok:
+        return jsonify({"msg": "Bad username or password"}), 401
+    if new_hash is not None:
+        # 雜湊參數已更新，寫回新的雜湊
+        db.session.execute(update(User).where(User.id == user.id).values(password_hash=new_hash))
+        db.session.commit()
+    remember_user_profile(user.id, user.username, user.role)
 
     access_token = create_access_token(identity=user.id)
     refresh_token = create_refresh_token(identity=user.id)
@@ -82,11 +167,30 @@ def refresh():
 @auth_bp.route("/logout", methods=["DELETE"])
 @jwt_required()
 def modify_token():
-    jti = get_jwt()["jti"]
+    token = get_jwt()
+    jti = token["jti"]
+    exp = token.get("exp")
     now = datetime.now(timezone.utc)
-    db.session.add(TokenBlocklist(jti=jti, created_at=now))
+    expires_at = datetime.fromtimestamp(exp, timezone.utc) if exp is not None else None
+    db.session.add(TokenBlocklist(jti=jti, created_at=now, expires_at=expires_at))
+    if db.engine.dialect.name == "postgresql":
+        # commit 時通知所有 worker 更新 blocklist 快取
+        db.session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": current_app.config["TOKEN_REVOCATION_CHANNEL"],
+             "payload": notify_payload(jti, exp)},
+        )
     db.session.commit()
+    revocation_cache.mark_revoked(jti, exp)
     resp = jsonify(logout=True)
     # 同時清掉 access & refresh (及 CSRF) cookies
     unset_jwt_cookies(resp)
     return resp, 200
+
+
+@auth_bp.route("/hash-stats", methods=["GET"])
+@jwt_required()
+@role_required("admin")
+def hash_stats():
+    return jsonify(password_hasher.snapshot())
+
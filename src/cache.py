@@ -0,0 +1,200 @@
+"""行程內共用的快取工具"""
+import gzip
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """有容量上限的 LRU 快取，每筆資料各自帶有到期時間 (epoch 秒)"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at: float):
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+try:
+    import brotli
+except ImportError:  # 選用相依套件
+    brotli = None
+
+
+class MemoryResponseBackend:
+    """以總位元組數為上限的 LRU；另外記錄每個 scope 底下有哪些 key"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: OrderedDict = OrderedDict()
+        self._scopes: dict[str, set] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(entry: dict) -> int:
+        return sum(len(v) for v in entry.values() if isinstance(v, bytes))
+
+    def get(self, scope: str, key: str) -> dict | None:
+        with self._lock:
+            entry = self._data.get((scope, key))
+            if entry is not None:
+                self._data.move_to_end((scope, key))
+            return entry
+
+    def set(self, scope: str, key: str, entry: dict):
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove((scope, key))
+            self._data[(scope, key)] = entry
+            self._scopes.setdefault(scope, set()).add(key)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, full_key):
+        entry = self._data.pop(full_key, None)
+        if entry is None:
+            return
+        self._size -= self._entry_size(entry)
+        keys = self._scopes.get(full_key[0])
+        if keys is not None:
+            keys.discard(full_key[1])
+            if not keys:
+                del self._scopes[full_key[0]]
+
+    def invalidate(self, scope: str):
+        with self._lock:
+            for key in list(self._scopes.get(scope, ())):
+                self._remove((scope, key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._scopes.clear()
+            self._size = 0
+
+
+class RedisResponseBackend:
+    """每個 scope 一個 hash，失效時整個 hash 刪掉；容量交給 Redis 的 maxmemory 政策"""
+
+    def __init__(self, url: str, ttl: int, prefix: str = "respcache:"):
+        # 只有選用 redis 後端時才載入，縮短冷啟動
+        try:
+            import redis
+        except ImportError:  # 選用相依套件
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the redis package") from None
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, scope: str, key: str) -> dict | None:
+        values = self.client.hmget(self.prefix + scope, [key, key + ":gzip", key + ":br", key + ":type"])
+        if values[0] is None:
+            return None
+        entry = {"identity": values[0], "mimetype": (values[3] or b"application/json").decode()}
+        if values[1] is not None:
+            entry["gzip"] = values[1]
+        if values[2] is not None:
+            entry["br"] = values[2]
+        return entry
+
+    def set(self, scope: str, key: str, entry: dict):
+        mapping = {key: entry["identity"], key + ":type": entry["mimetype"]}
+        for encoding in ("gzip", "br"):
+            if encoding in entry:
+                mapping[f"{key}:{encoding}"] = entry[encoding]
+        pipe = self.client.pipeline()
+        pipe.hset(self.prefix + scope, mapping=mapping)
+        pipe.expire(self.prefix + scope, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, scope: str):
+        self.client.delete(self.prefix + scope)
+
+    def clear(self):
+        for name in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(name)
+
+
+class ResponseCache:
+    """已編碼 (可選壓縮) 的 JSON 回應快取，以 init_app 選擇後端"""
+
+    def __init__(self):
+        self.backend = None
+        self.compress_min_bytes = 1024
+
+    def init_app(self, app):
+        kind = app.config["RESPONSE_CACHE_BACKEND"]
+        if kind == "memory":
+            self.backend = MemoryResponseBackend(app.config["RESPONSE_CACHE_MAX_BYTES"])
+        elif kind == "redis":
+            self.backend = RedisResponseBackend(
+                app.config["RESPONSE_CACHE_REDIS_URL"], app.config["RESPONSE_CACHE_TTL"])
+        else:
+            self.backend = None
+        self.compress_min_bytes = app.config["RESPONSE_CACHE_COMPRESS_MIN_BYTES"]
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def build_entry(self, body: bytes, mimetype: str) -> dict:
+        entry = {"identity": body, "mimetype": mimetype}
+        if len(body) >= self.compress_min_bytes:
+            entry["gzip"] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                entry["br"] = brotli.compress(body, quality=5)
+        return entry
+
+    def get(self, scope: str, key: str) -> dict | None:
+        return self.backend.get(scope, key) if self.backend else None
+
+    def set(self, scope: str, key: str, entry: dict):
+        if self.backend:
+            self.backend.set(scope, key, entry)
+
+    def invalidate(self, scopes):
+        if self.backend:
+            for scope in scopes:
+                self.backend.invalidate(scope)
+
+    def clear(self):
+        if self.backend:
+            self.backend.clear()
+
+
+response_cache = ResponseCache()
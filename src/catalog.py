@@ -0,0 +1,133 @@
+"""餐廳 / 菜單的唯讀查詢：只撈需要的欄位，不建立 ORM 物件"""
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import func, select, tuple_
+from models import db, Restaurant, RestaurantMenu
+from schemas import MenuView, RestaurantView, SearchResultView
+
+RESTAURANT_COLUMNS = (
+    Restaurant.id,
+    Restaurant.restaurant_name,
+    Restaurant.image_key,
+    Restaurant.created_at,
+    Restaurant.updated_at,
+)
+
+MENU_COLUMNS = (
+    RestaurantMenu.id,
+    RestaurantMenu.restaurant_id,
+    RestaurantMenu.image_key,
+    RestaurantMenu.dish_name,
+    RestaurantMenu.cuisine,
+    RestaurantMenu.menu_category,
+    RestaurantMenu.price,
+)
+
+
+def menus_by_restaurant(session, restaurant_ids=None) -> dict:
+    """restaurant_id -> [MenuView]；session 由呼叫端傳入 (commit 前的 hook 也會用到)"""
+    stmt = select(*MENU_COLUMNS).order_by(
+        RestaurantMenu.restaurant_id, RestaurantMenu.created_at, RestaurantMenu.id)
+    if restaurant_ids is not None:
+        stmt = stmt.where(RestaurantMenu.restaurant_id.in_(restaurant_ids))
+    grouped = defaultdict(list)
+    for row in session.execute(stmt):
+        grouped[row.restaurant_id].append(MenuView(row))
+    return grouped
+
+
+def fetch_restaurants_with_menus() -> list[RestaurantView]:
+    # 兩次查詢取代 joinedload 的笛卡兒積：餐廳欄位不會隨每道菜重複傳輸
+    restaurants = db.session.execute(
+        select(*RESTAURANT_COLUMNS).order_by(Restaurant.id)).all()
+    menus = menus_by_restaurant(db.session)
+    return [RestaurantView(r, menus.get(r.id, [])) for r in restaurants]
+
+
+def iter_restaurants_with_menus(batch_size: int):
+    # 伺服器端 cursor 分批讀餐廳，每批再用 IN (...) 取該批菜單
+    stmt = (
+        select(*RESTAURANT_COLUMNS)
+        .order_by(Restaurant.id)
+        .execution_options(yield_per=batch_size, stream_results=True)
+    )
+    for batch in db.session.execute(stmt).partitions():
+        menus = menus_by_restaurant(db.session, [r.id for r in batch])
+        for r in batch:
+            yield RestaurantView(r, menus.get(r.id, []))
+
+
+def fetch_restaurant_menu(restaurant_id: uuid.UUID) -> tuple[str, list[MenuView]] | None:
+    """回傳 (restaurant_name, 菜單)；餐廳不存在時回傳 None"""
+    stmt = (
+        select(Restaurant.restaurant_name, *MENU_COLUMNS)
+        .select_from(Restaurant)
+        .outerjoin(RestaurantMenu, RestaurantMenu.restaurant_id == Restaurant.id)
+        .where(Restaurant.id == restaurant_id)
+        .order_by(RestaurantMenu.created_at, RestaurantMenu.id)
+    )
+    rows = db.session.execute(stmt).all()
+    if not rows:
+        return None
+    return rows[0].restaurant_name, [MenuView(r) for r in rows if r.id is not None]
+
+
+SEARCH_SORT_KEYS = {
+    "price": RestaurantMenu.price,
+    "rating": func.coalesce(RestaurantMenu.rating, 0),
+}
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_menus(
+    q: str | None = None,
+    cuisine: str | None = None,
+    category: str | None = None,
+    min_price: int | None = None,
+    max_price: int | None = None,
+    sort: str = "price",
+    descending: bool = False,
+    limit: int = 50,
+    after: tuple | None = None,
+) -> tuple[list[SearchResultView], tuple | None]:
+    """回傳 (結果, 下一頁的 (排序值, id))；沒有下一頁時第二項為 None"""
+    sort_key = SEARCH_SORT_KEYS[sort]
+    stmt = (
+        select(*MENU_COLUMNS, RestaurantMenu.rating, Restaurant.restaurant_name,
+               sort_key.label("sort_value"))
+        .join(Restaurant, Restaurant.id == RestaurantMenu.restaurant_id)
+    )
+    if q:
+        # 由 pg_trgm GIN 索引處理
+        stmt = stmt.where(RestaurantMenu.dish_name.ilike(f"%{_escape_like(q)}%", escape="\\"))
+    if cuisine:
+        stmt = stmt.where(RestaurantMenu.cuisine == cuisine)
+    if category:
+        stmt = stmt.where(RestaurantMenu.menu_category == category)
+    if min_price is not None:
+        stmt = stmt.where(RestaurantMenu.price >= min_price)
+    if max_price is not None:
+        stmt = stmt.where(RestaurantMenu.price <= max_price)
+    if after is not None:
+        key = tuple_(sort_key, RestaurantMenu.id)
+        stmt = stmt.where(key < tuple_(*after) if descending else key > tuple_(*after))
+
+    if descending:
+        stmt = stmt.order_by(sort_key.desc(), RestaurantMenu.id.desc())
+    else:
+        stmt = stmt.order_by(sort_key, RestaurantMenu.id)
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = (rows[-1].sort_value, rows[-1].id)
+    return [SearchResultView(r) for r in rows], next_key
+
+
+def parse_sort_value(sort: str, raw):
+    return int(raw) if sort == "price" else Decimal(str(raw))
@@ -0,0 +1,174 @@
+"""以 PostgreSQL COPY 批次匯入 / 匯出餐廳與菜單 (CSV 或 NDJSON)"""
+import csv
+import psycopg2
+
+# CSV 格式搭配不會出現在 JSON 內的 quote / delimiter，讓每行 JSON 原樣進出 COPY
+_RAW_LINE = "(FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')"
+
+TABLES = {
+    "restaurants": {
+        "table": "restaurant",
+        "columns": {
+            "id": "uuid",
+            "restaurant_name": "varchar(120)",
+            "image_key": "varchar(255)",
+            "created_at": "timestamptz",
+            "updated_at": "timestamptz",
+        },
+        "export": (
+            "SELECT id, restaurant_name, image_key, created_at, updated_at "
+            "FROM restaurant ORDER BY created_at, id"
+        ),
+    },
+    "menus": {
+        "table": "restaurant_menu",
+        "columns": {
+            "id": "uuid",
+            "restaurant_id": "uuid",
+            "restaurant_name": "varchar(120)",
+            "image_key": "varchar(255)",
+            "dish_name": "varchar(120)",
+            "cuisine": "varchar(80)",
+            "rating": "numeric(2,1)",
+            "menu_category": "varchar(50)",
+            "price": "integer",
+            "created_at": "timestamptz",
+            "updated_at": "timestamptz",
+        },
+        # 匯出時帶上 restaurant_name，換資料庫時可用名稱對應餐廳
+        "export": (
+            "SELECT m.id, m.restaurant_id, r.restaurant_name, m.image_key, m.dish_name, "
+            "m.cuisine, m.rating, m.menu_category, m.price, m.created_at, m.updated_at "
+            "FROM restaurant_menu m JOIN restaurant r ON r.id = m.restaurant_id "
+            "ORDER BY m.restaurant_id, m.created_at, m.id"
+        ),
+    },
+}
+
+# staging → 正式資料表：先以 id 對應既有餐廳 (update 時連名稱一起改)，
+# 其餘視為新餐廳；與既有餐廳同名時依 on_conflict 略過或更新該餐廳 (保留它原本的 id)
+# updated_at 一律是寫入本資料庫的時間，否則增量同步會漏掉帶著舊時間匯入的資料
+_UPDATE_RESTAURANTS_BY_ID = """
+UPDATE restaurant r
+SET restaurant_name = s.restaurant_name, image_key = s.image_key, updated_at = now()
+FROM (SELECT DISTINCT ON (id) id, restaurant_name, image_key
+      FROM catalog_staging WHERE restaurant_name IS NOT NULL ORDER BY id) s
+WHERE r.id = s.id
+"""
+
+_INSERT_RESTAURANTS = """
+INSERT INTO restaurant (id, restaurant_name, image_key, created_at, updated_at)
+SELECT DISTINCT ON (restaurant_name)
+       id, restaurant_name, image_key,
+       COALESCE(created_at, now()), now()
+FROM catalog_staging s
+WHERE restaurant_name IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM restaurant r WHERE r.id = s.id)
+ORDER BY restaurant_name
+ON CONFLICT (restaurant_name) DO {action}
+"""
+_RESTAURANT_UPDATE = "UPDATE SET image_key = EXCLUDED.image_key, updated_at = now()"
+
+_MERGE_MENUS = """
+INSERT INTO restaurant_menu (id, restaurant_id, image_key, dish_name, cuisine, rating,
+                             menu_category, price, created_at, updated_at)
+SELECT DISTINCT ON (s.id)
+       s.id, COALESCE(by_id.id, by_name.id), s.image_key, s.dish_name, s.cuisine,
+       COALESCE(s.rating, 0.0), s.menu_category, COALESCE(s.price, 0),
+       COALESCE(s.created_at, now()), now()
+FROM catalog_staging s
+LEFT JOIN restaurant by_id ON by_id.id = s.restaurant_id
+LEFT JOIN restaurant by_name ON by_name.restaurant_name = s.restaurant_name
+WHERE COALESCE(by_id.id, by_name.id) IS NOT NULL
+  AND s.dish_name IS NOT NULL AND s.cuisine IS NOT NULL AND s.menu_category IS NOT NULL
+ON CONFLICT (id) DO {action}
+"""
+_MENU_UPDATE = (
+    "UPDATE SET restaurant_id = EXCLUDED.restaurant_id, image_key = EXCLUDED.image_key, "
+    "dish_name = EXCLUDED.dish_name, cuisine = EXCLUDED.cuisine, rating = EXCLUDED.rating, "
+    "menu_category = EXCLUDED.menu_category, price = EXCLUDED.price, updated_at = now()"
+)
+
+_BUMP_VERSIONS = """
+INSERT INTO catalog_version (scope, version)
+SELECT 'catalog', 1 UNION ALL SELECT id::text, 1 FROM restaurant
+ON CONFLICT (scope) DO UPDATE SET version = catalog_version.version + 1
+"""
+
+
+def export_table(raw_conn, kind: str, fileobj, fmt: str) -> int:
+    spec = TABLES[kind]
+    with raw_conn.cursor() as cur:
+        if fmt == "csv":
+            cur.copy_expert(f"COPY ({spec['export']}) TO STDOUT WITH (FORMAT csv, HEADER true)", fileobj)
+        else:
+            cur.copy_expert(
+                f"COPY (SELECT row_to_json(t) FROM ({spec['export']}) t) TO STDOUT WITH {_RAW_LINE}",
+                fileobj,
+            )
+        return cur.rowcount
+
+
+def _csv_header(fileobj, allowed) -> list[str]:
+    # 只讀第一行決定欄位，接著把檔案位置倒回開頭交給 COPY (HEADER true 會略過它)
+    start = fileobj.tell()
+    header = next(csv.reader([fileobj.readline().decode("utf-8-sig")]), [])
+    fileobj.seek(start)
+    unknown = [c for c in header if c not in allowed]
+    if unknown:
+        raise ValueError(f"unknown columns: {', '.join(unknown)}")
+    return header
+
+
+def import_table(raw_conn, kind: str, fileobj, fmt: str, on_conflict: str = "skip") -> tuple[int, int]:
+    """回傳 (讀入筆數, 寫入筆數)；fileobj 需以二進位模式開啟
+
+    違反 unique / foreign key 等限制時整批取消，以 ValueError 指出是哪一筆資料
+    """
+    try:
+        return _import_table(raw_conn, kind, fileobj, fmt, on_conflict)
+    except psycopg2.IntegrityError as e:
+        raw_conn.rollback()
+        detail = e.diag.message_detail or e.diag.message_primary
+        raise ValueError(f"{kind} import rolled back, conflicting row: {detail}") from e
+
+
+def _import_table(raw_conn, kind: str, fileobj, fmt: str, on_conflict: str) -> tuple[int, int]:
+    spec = TABLES[kind]
+    columns = spec["columns"]
+    column_defs = ", ".join(f"{name} {type_}" for name, type_ in columns.items())
+
+    with raw_conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE catalog_staging ({column_defs}) ON COMMIT DROP")
+        if fmt == "csv":
+            header = _csv_header(fileobj, columns)
+            cur.copy_expert(
+                f"COPY catalog_staging ({', '.join(header)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                fileobj,
+            )
+        else:
+            cur.execute("CREATE TEMP TABLE catalog_staging_json (doc jsonb) ON COMMIT DROP")
+            cur.copy_expert(f"COPY catalog_staging_json (doc) FROM STDIN WITH {_RAW_LINE}", fileobj)
+            cur.execute(
+                f"INSERT INTO catalog_staging SELECT t.* FROM catalog_staging_json, "
+                f"jsonb_populate_record(NULL::catalog_staging, doc) t"
+            )
+        loaded = cur.rowcount
+        cur.execute("UPDATE catalog_staging SET id = gen_random_uuid() WHERE id IS NULL")
+
+        written = 0
+        if kind == "restaurants":
+            action = _RESTAURANT_UPDATE if on_conflict == "update" else "NOTHING"
+            if on_conflict == "update":
+                cur.execute(_UPDATE_RESTAURANTS_BY_ID)
+                written += cur.rowcount
+            cur.execute(_INSERT_RESTAURANTS.format(action=action))
+        else:
+            action = _MENU_UPDATE if on_conflict == "update" else "NOTHING"
+            cur.execute(_MERGE_MENUS.format(action=action))
+        written += cur.rowcount
+        if written:
+            # 匯入可能影響任何餐廳，全部的版本號一起 +1 (ETag 失效)
+            cur.execute(_BUMP_VERSIONS)
+    raw_conn.commit()
+    return loaded, written
@@ -0,0 +1,144 @@
+import time
+from datetime import timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+from cache import response_cache
+from catalog_io import TABLES, export_table, import_table
+from facets import ensure_facet_view, refresh_facet_view
+from menu_snapshot import rebuild_all_menu_snapshots, snapshots_enabled
+from models import db, CatalogTombstone, Restaurant, RestaurantMenu, RestaurantMenuSnapshot, TOMBSTONE_TRIGGER_DDL
+from revocation import prune_expired, rebuild_bloom, revocation_cache
+from sync import prune_tombstones
+
+tokens_cli = AppGroup("tokens", help="JWT blocklist maintenance.")
+
+
+@tokens_cli.command("prune")
+def prune_tokens():
+    """Delete blocklist rows whose token has already expired."""
+    deleted = prune_expired(db.session, current_app.config["JWT_REFRESH_TOKEN_EXPIRES"])
+    click.echo(f"deleted {deleted} expired blocklist rows")
+
+
+@tokens_cli.command("stats")
+def token_stats():
+    """Show blocklist table size and Bloom filter sizing."""
+    rebuild_bloom(
+        db.engine,
+        max_lifetime=current_app.config["JWT_REFRESH_TOKEN_EXPIRES"],
+        capacity=current_app.config["TOKEN_BLOOM_CAPACITY"],
+        error_rate=current_app.config["TOKEN_BLOOM_ERROR_RATE"],
+    )
+    bloom = revocation_cache.bloom
+    click.echo(f"table_rows={revocation_cache.stats['table_rows']}")
+    click.echo(f"live_revoked={revocation_cache.stats['live_revoked']}")
+    click.echo(f"bloom_bits={bloom.num_bits} bloom_hashes={bloom.num_hashes}")
+
+
+@tokens_cli.command("upgrade-schema")
+def upgrade_token_schema():
+    """Add the expires_at column to an existing token_blocklist table."""
+    db.session.execute(text(
+        "ALTER TABLE token_blocklist ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP WITH TIME ZONE"))
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_token_blocklist_expires_at ON token_blocklist (expires_at)"))
+    db.session.commit()
+    click.echo("token_blocklist schema is up to date")
+
+
+schema_cli = AppGroup("schema", help="Database schema management.")
+
+
+@schema_cli.command("create")
+def create_schema():
+    """Create any missing tables (run once per deploy, not on every worker boot)."""
+    db.create_all()
+    click.echo("tables are up to date")
+
+
+catalog_cli = AppGroup("catalog", help="Bulk catalog import / export via COPY.")
+
+_KIND = click.argument("kind", type=click.Choice(sorted(TABLES)))
+_FORMAT = click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default="csv")
+
+
+def _report(action: str, rows: int, started: float):
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed else 0
+    click.echo(f"{action} {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+
+@catalog_cli.command("upgrade-schema")
+def upgrade_catalog_schema():
+    """Create pg_trgm, missing catalog indexes, the facet view, sync tombstones and menu snapshots."""
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for table in (Restaurant.__table__, RestaurantMenu.__table__):
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        ensure_facet_view(conn, current_app.config["MENU_FACETS_PRICE_BUCKET"])
+        CatalogTombstone.__table__.create(conn, checkfirst=True)
+        RestaurantMenuSnapshot.__table__.create(conn, checkfirst=True)
+        for statement in TOMBSTONE_TRIGGER_DDL:
+            conn.execute(text(statement))
+    click.echo("catalog indexes are up to date")
+
+
+@catalog_cli.command("rebuild-menu-snapshots")
+def rebuild_menu_snapshots():
+    """Regenerate the stored menu response of every restaurant."""
+    started = time.perf_counter()
+    written = rebuild_all_menu_snapshots(db.session)
+    _report("rebuilt", written, started)
+
+
+@catalog_cli.command("prune-tombstones")
+def prune_catalog_tombstones():
+    """Delete sync tombstones older than CATALOG_TOMBSTONE_RETENTION_DAYS."""
+    retention = timedelta(days=current_app.config["CATALOG_TOMBSTONE_RETENTION_DAYS"])
+    deleted = prune_tombstones(db.session, retention)
+    click.echo(f"deleted {deleted} expired tombstones")
+
+
+@catalog_cli.command("export")
+@_KIND
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@_FORMAT
+def export_catalog(kind, path, fmt):
+    """Export restaurants or menus to PATH."""
+    started = time.perf_counter()
+    raw_conn = db.engine.raw_connection()
+    try:
+        with open(path, "wb") as fileobj:
+            rows = export_table(raw_conn, kind, fileobj, fmt)
+    finally:
+        raw_conn.close()
+    _report("exported", rows, started)
+
+
+@catalog_cli.command("import")
+@_KIND
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@_FORMAT
+@click.option("--on-conflict", type=click.Choice(["skip", "update"]), default="skip",
+              help="What to do with rows that already exist.")
+def import_catalog(kind, path, fmt, on_conflict):
+    """Import restaurants or menus from PATH through a staging table."""
+    started = time.perf_counter()
+    raw_conn = db.engine.raw_connection()
+    try:
+        with open(path, "rb") as fileobj:
+            loaded, written = import_table(raw_conn, kind, fileobj, fmt, on_conflict)
+        response_cache.clear()
+        if current_app.config["MENU_FACETS_SOURCE"] == "view":
+            refresh_facet_view(db.engine)
+        if snapshots_enabled():
+            rebuild_all_menu_snapshots(db.session)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        raw_conn.close()
+    _report("loaded", loaded, started)
+    click.echo(f"wrote {written} rows, skipped {loaded - written}")
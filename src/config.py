@@ -1,6 +1,7 @@
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
+from db_pool import engine_options
 load_dotenv()
 
 
@@ -10,10 +11,85 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = os.getenv("SUPABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True
-    }
+    # 建表改在部署時執行 `flask schema create`；每個 worker 啟動都跑 create_all 會拖慢冷啟動
+    SCHEMA_CREATE_ON_STARTUP = os.getenv("SCHEMA_CREATE_ON_STARTUP", "false").lower() == "true"
+    # JSON 編碼：auto 依序嘗試 msgspec、orjson，最後退回標準庫
+    JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+    # 連線池：queue 每個 worker 保留 GUNICORN_THREADS 條連線 (+ 背景執行緒用的 overflow)
+    # pgbouncer 用於 Supabase pooler (transaction mode)，不在行程內保留連線
+    # gevent worker 的 greenlet 數遠大於連線數，改用固定大小的 pool 讓 greenlet 排隊
+    GUNICORN_WORKER_CLASS = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+    GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "1"))
+    DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue")
+    DB_POOL_SIZE = int(os.getenv(
+        "DB_POOL_SIZE", "10" if GUNICORN_WORKER_CLASS == "gevent" else str(GUNICORN_THREADS)
+    ))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "2"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    # 比 Supabase / 防火牆的閒置斷線時間短，取代每次 checkout 的 pre-ping
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+    # gevent worker 同時處理的請求上限 (其餘依到達順序排隊)，0 表示不限制
+    GEVENT_REQUEST_LIMIT = int(os.getenv("GEVENT_REQUEST_LIMIT", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI, DB_POOL_MODE, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+        DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    )
+
+    # 餐廳列表分頁設定
+    RESTAURANT_PAGE_SIZE = int(os.getenv("RESTAURANT_PAGE_SIZE", "50"))
+    RESTAURANT_PAGE_SIZE_MAX = int(os.getenv("RESTAURANT_PAGE_SIZE_MAX", "200"))
+    # 菜單搜尋分頁設定
+    MENU_SEARCH_PAGE_SIZE = int(os.getenv("MENU_SEARCH_PAGE_SIZE", "50"))
+    MENU_SEARCH_PAGE_SIZE_MAX = int(os.getenv("MENU_SEARCH_PAGE_SIZE_MAX", "200"))
+    # /with-menus 串流模式每批從資料庫取出的餐廳數
+    CATALOG_STREAM_BATCH_SIZE = int(os.getenv("CATALOG_STREAM_BATCH_SIZE", "100"))
+    # 目錄回應快取：memory (每個 worker 各自一份) / redis / none
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_CACHE_COMPRESS_MIN_BYTES", "1024"))
+    # 菜單批次匯入：單次請求上限與每個 INSERT 的筆數
+    BULK_MENU_MAX_ITEMS = int(os.getenv("BULK_MENU_MAX_ITEMS", "5000"))
+    BULK_MENU_BATCH_SIZE = int(os.getenv("BULK_MENU_BATCH_SIZE", "500"))
+    # 菜單統計 (facets)：live 每次即時 GROUPING SETS 查詢；view 讀 materialized view，寫入後於背景刷新
+    MENU_FACETS_SOURCE = os.getenv("MENU_FACETS_SOURCE", "live")
+    MENU_FACETS_PRICE_BUCKET = int(os.getenv("MENU_FACETS_PRICE_BUCKET", "100"))
+    MENU_FACETS_REFRESH_INTERVAL = float(os.getenv("MENU_FACETS_REFRESH_INTERVAL", "5"))
+    # 每家餐廳菜單的預先產生回應 (寫入時重建)；開啟前先執行 flask catalog rebuild-menu-snapshots
+    MENU_SNAPSHOT_ENABLED = os.getenv("MENU_SNAPSHOT_ENABLED", "false").lower() == "true"
+    # 增量同步 (/api/sync/catalog)：每頁每種資料的筆數上限
+    CATALOG_SYNC_PAGE_SIZE = int(os.getenv("CATALOG_SYNC_PAGE_SIZE", "500"))
+    CATALOG_SYNC_PAGE_SIZE_MAX = int(os.getenv("CATALOG_SYNC_PAGE_SIZE_MAX", "5000"))
+    # 回傳的 watermark 往前退這麼多秒，涵蓋查詢當下尚未 commit 的交易 (客戶端依 id 去重)
+    CATALOG_SYNC_OVERLAP_SECONDS = int(os.getenv("CATALOG_SYNC_OVERLAP_SECONDS", "5"))
+    # 刪除紀錄保留天數；watermark 比這更舊的客戶端需要重新完整下載
+    CATALOG_TOMBSTONE_RETENTION_DAYS = int(os.getenv("CATALOG_TOMBSTONE_RETENTION_DAYS", "30"))
     
+    # 密碼雜湊：werkzeug 的 method 字串 (scrypt:n:r:p 或 pbkdf2:sha256:iterations)
+    # 參數變更後，使用者下次登入時自動以新參數重新雜湊
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    # 每個 gunicorn worker 的雜湊子行程數，0 表示在 request 執行緒內計算
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "1"))
+    # 排隊超過上限直接回 503，避免登入尖峰拖垮其他 API
+    PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+    # user id -> (username, role) 快取秒數；角色變更最晚在這段時間後生效
+    USER_PROFILE_CACHE_TTL = int(os.getenv("USER_PROFILE_CACHE_TTL", "300"))
+
+    # 每個請求的 SQL 次數 / DB、簽章、序列化時間：Server-Timing header 與 /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "true").lower() == "true"
+    # 同一台機器上所有 gunicorn worker 共用的目錄，各 worker 每 FLUSH_INTERVAL 秒寫入一次
+    METRICS_DIR = os.getenv("METRICS_DIR", "/tmp/food-list-metrics")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+    # 同一段 SQL 在一個請求內執行超過這個次數就視為 N+1
+    METRICS_N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "5"))
+    # /metrics 需要 Authorization: Bearer <token>；沒有設定時 /metrics 一律拒絕
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
     # 重要：統一 JWT Secret Key 名稱
     JWT_SECRET_KEY = os.getenv("JWT_SECRET")
     JWT_VERIFY_SUB = False
@@ -25,6 +101,21 @@ class Config:
     JWT_COOKIE_SECURE = True  # 開發環境設為 False
     JWT_ACCESS_COOKIE_NAME = "access_token"   
     JWT_REFRESH_COOKIE_NAME = "refresh_token"
+
+    # token blocklist 快取：撤銷的 jti 保留到 token 過期；
+    # 未撤銷的結果最多快取 NEGATIVE_TTL 秒，並透過 Postgres LISTEN/NOTIFY 即時失效
+    TOKEN_BLOCKLIST_CACHE_SIZE = int(os.getenv("TOKEN_BLOCKLIST_CACHE_SIZE", "10000"))
+    TOKEN_BLOCKLIST_NEGATIVE_TTL = int(os.getenv("TOKEN_BLOCKLIST_NEGATIVE_TTL", "60"))
+    # transaction pooler 不支援 LISTEN，pgbouncer 模式預設關閉 (撤銷改靠 negative TTL 生效)
+    TOKEN_REVOCATION_LISTEN = os.getenv(
+        "TOKEN_REVOCATION_LISTEN", "false" if DB_POOL_MODE == "pgbouncer" else "true"
+    ).lower() == "true"
+    TOKEN_REVOCATION_CHANNEL = os.getenv("TOKEN_REVOCATION_CHANNEL", "token_revoked")
+    # 撤銷 jti 的 Bloom filter (需要 LISTEN 執行緒才會啟用)
+    TOKEN_BLOOM_ENABLED = os.getenv("TOKEN_BLOOM_ENABLED", "true").lower() == "true"
+    TOKEN_BLOOM_CAPACITY = int(os.getenv("TOKEN_BLOOM_CAPACITY", "100000"))
+    TOKEN_BLOOM_ERROR_RATE = float(os.getenv("TOKEN_BLOOM_ERROR_RATE", "0.001"))
+    TOKEN_BLOOM_REFRESH_SECONDS = int(os.getenv("TOKEN_BLOOM_REFRESH_SECONDS", "3600"))
     
     # 修正：本地開發使用 "Lax"，生產環境使用 "None"
     JWT_COOKIE_SAMESITE = "None"  # 本地開發時使用 "Lax"
@@ -0,0 +1,120 @@
+"""資料庫連線池設定與統計 (每個 gunicorn worker 各自一份)"""
+import threading
+import time
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+from auth import role_required
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+pool_bp = Blueprint("db_pool", __name__, url_prefix="/api/db")
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pool = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.in_use_peak = 0
+        self.overflow_peak = 0
+
+    def observe(self, pool, waited: float, outcome: str = "ok"):
+        """outcome：ok 取得連線、timeout 等不到 pool 的連線、error 連線失敗 (資料庫無回應、驗證錯誤等)"""
+        with self._lock:
+            self.pool = pool
+            if outcome == "timeout":
+                self.timeouts += 1
+            elif outcome == "error":
+                self.errors += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if isinstance(pool, QueuePool):
+                self.in_use_peak = max(self.in_use_peak, pool.checkedout())
+                self.overflow_peak = max(self.overflow_peak, pool.overflow())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "wait_seconds_total": round(self.wait_total, 6),
+                "wait_seconds_max": round(self.wait_max, 6),
+            }
+        pool = self.pool
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                # 負值代表尚未建滿 pool_size
+                "overflow": max(pool.overflow(), 0),
+                "in_use_peak": self.in_use_peak,
+                "overflow_peak": self.overflow_peak,
+            })
+        return stats
+
+
+pool_stats = PoolStats()
+
+
+class _TimedCheckout:
+    """量測從要求連線到取得連線花的時間 (含等待其他執行緒歸還、或建立新連線)"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            conn = super().connect()
+        except PoolTimeoutError:
+            pool_stats.observe(self, time.perf_counter() - started, "timeout")
+            raise
+        except Exception:
+            pool_stats.observe(self, time.perf_counter() - started, "error")
+            raise
+        pool_stats.observe(self, time.perf_counter() - started)
+        return conn
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def engine_options(uri: str | None, mode: str, pool_size: int, max_overflow: int,
+                   timeout: float, recycle: int, pre_ping: bool) -> dict:
+    """pool 模式：每個 worker 自己的 QueuePool；pgbouncer 模式：不保留連線，交給外部 pooler"""
+    options = {"pool_pre_ping": pre_ping}
+    if mode == "pgbouncer":
+        # transaction pooling 下同一條 server 連線會輪流給不同 client，不能使用具名 prepared statement
+        connect_args = {}
+        if uri and "+psycopg://" in uri:
+            connect_args["prepare_threshold"] = None
+        elif uri and "+asyncpg://" in uri:
+            connect_args["statement_cache_size"] = 0
+        options.update(poolclass=InstrumentedNullPool, connect_args=connect_args)
+        return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=timeout,
+        pool_recycle=recycle,
+        pool_use_lifo=True,
+    )
+    return options
+
+
+@pool_bp.route("/pool-stats", methods=["GET"])
+@jwt_required()
+@role_required("admin")
+def db_pool_stats():
+    return jsonify(pool_stats.snapshot())
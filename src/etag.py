@@ -0,0 +1,96 @@
+"""以目錄版本號產生 ETag，處理 If-None-Match 條件式 GET"""
+import hashlib
+from functools import wraps
+from flask import request, make_response, Response
+from sqlalchemy import select, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from cache import response_cache
+from facets import mark_facets_stale
+from image_manager import current_url_bucket, wants_image_urls
+from menu_snapshot import mark_menu_snapshots_stale
+from models import db, CatalogVersion
+
+CATALOG_SCOPE = "catalog"
+
+
+def bump_catalog_version(restaurant_ids=()) -> None:
+    """在目前的 transaction 內把整份目錄 (及指定餐廳) 的版本號 +1"""
+    scopes = [CATALOG_SCOPE, *sorted({str(rid) for rid in restaurant_ids})]
+    stmt = pg_insert(CatalogVersion).values([{"scope": s, "version": 1} for s in scopes])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CatalogVersion.scope],
+        set_={"version": CatalogVersion.version + 1},
+    )
+    db.session.execute(stmt)
+    # 版本號已經是快取 key 的一部分；這裡只是提早釋放舊資料 (共用後端時也通知其他 worker)
+    response_cache.invalidate(scopes)
+    mark_facets_stale()
+    # 菜單快照在 commit 前重建，與這次寫入同一個 transaction
+    mark_menu_snapshots_stale(restaurant_ids)
+
+
+def get_catalog_version(scope: str) -> int:
+    version = db.session.execute(
+        select(CatalogVersion.version).where(CatalogVersion.scope == literal(scope))
+    ).scalar()
+    return version or 0
+
+
+def _make_etag(scope: str, version: int) -> str:
+    # 不同路徑、查詢參數 (分頁、篩選、串流格式) 代表不同的表示法
+    parts = [scope, str(version), request.path, request.query_string.decode()]
+    if wants_image_urls():
+        # 內嵌的簽章 URL 隨時間桶改變
+        parts.append(str(current_url_bucket()))
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def _cached_response(entry: dict) -> Response:
+    encodings = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in entry and encodings[encoding]:
+            resp = Response(entry[encoding], mimetype=entry["mimetype"])
+            resp.headers["Content-Encoding"] = encoding
+            break
+    else:
+        resp = Response(entry["identity"], mimetype=entry["mimetype"])
+    return resp
+
+
+def _matching_etag(etag: str) -> str | None:
+    # 每種 content-coding 是不同的表示法，各有自己的強 ETag
+    for candidate in (etag, f"{etag}-gzip", f"{etag}-br"):
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def conditional_get(scope_fn=lambda **_: CATALOG_SCOPE):
+    """版本沒變時回 304，不查詢、不序列化資料；否則優先回傳已編碼的快取內容"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            scope = scope_fn(**kwargs)
+            etag = _make_etag(scope, get_catalog_version(scope))
+            if (matched := _matching_etag(etag)) is not None:
+                resp = make_response("", 304)
+                resp.set_etag(matched)
+            elif (entry := response_cache.get(scope, etag)) is not None:
+                resp = _cached_response(entry)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                if response_cache.enabled and not resp.is_streamed:
+                    entry = response_cache.build_entry(resp.get_data(), resp.mimetype)
+                    response_cache.set(scope, etag, entry)
+                    resp = _cached_response(entry)
+            if resp.status_code != 304:
+                encoding = resp.headers.get("Content-Encoding")
+                resp.set_etag(f"{etag}-{encoding}" if encoding else etag)
+            # 同一個 URL 依 Accept-Encoding 回傳不同內容；304 也要帶上
+            resp.vary.add("Accept-Encoding")
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapper
+    return decorator
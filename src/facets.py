@@ -0,0 +1,171 @@
+"""菜單的 cuisine / category / 價格分布統計，可選擇由 materialized view 提供"""
+import logging
+import os
+import threading
+import time
+from sqlalchemy import Integer, Numeric, String, case, cast, event, func, literal_column, select, text
+from sqlalchemy.exc import ProgrammingError
+from catalog import _escape_like
+from models import db, RestaurantMenu
+
+logger = logging.getLogger(__name__)
+
+FACET_VIEW = "menu_facet_counts"
+
+
+class FacetViewMismatch(Exception):
+    """materialized view 的價格區間寬度與設定不同 (改了設定但還沒重建 view)"""
+
+
+def facet_view_ddl(price_bucket: int) -> list[str]:
+    # 每次刷新都是整張重算 (200k 道菜約 0.1 秒)；寫入量大到背景刷新跟不上時，
+    # 再改成由觸發器逐筆增減的統計表
+    width = int(price_bucket)
+    return [
+        f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {FACET_VIEW} AS
+        SELECT cuisine, menu_category, floor(price::numeric / {width})::integer * {width} AS price_bucket,
+               {width} AS bucket_width, count(*) AS dishes
+        FROM restaurant_menu
+        GROUP BY cuisine, menu_category, price_bucket
+        """,
+        # REFRESH ... CONCURRENTLY 需要 unique index
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{FACET_VIEW}_key "
+        f"ON {FACET_VIEW} (cuisine, menu_category, price_bucket)",
+    ]
+
+
+def _facets_from_rows(rows, price_bucket: int) -> dict:
+    result = {"cuisine": [], "menu_category": [], "price": [], "total": 0}
+    for row in rows:
+        if row.kind == "cuisine":
+            result["cuisine"].append({"value": row.value, "count": row.count})
+            result["total"] += row.count
+        elif row.kind == "menu_category":
+            result["menu_category"].append({"value": row.value, "count": row.count})
+        else:
+            low = int(row.value)
+            result["price"].append({"min": low, "max": low + price_bucket - 1, "count": row.count})
+    for key in ("cuisine", "menu_category"):
+        result[key].sort(key=lambda item: (-item["count"], item["value"]))
+    result["price"].sort(key=lambda item: item["min"])
+    return result
+
+
+def live_facets(price_bucket: int, q: str | None = None, restaurant_id=None) -> dict:
+    """單一 GROUP BY GROUPING SETS 查詢算出三種分布"""
+    width = literal_column(str(int(price_bucket)), Integer)
+    # 負數價格也要往下取整，-50 落在 [-100, -1]
+    bucket = cast(func.floor(cast(RestaurantMenu.price, Numeric) / width), Integer) * width
+    is_cuisine = func.grouping(RestaurantMenu.cuisine) == 0
+    is_category = func.grouping(RestaurantMenu.menu_category) == 0
+    kind = case(
+        (is_cuisine, "cuisine"), (is_category, "menu_category"), else_="price")
+    value = case(
+        (is_cuisine, RestaurantMenu.cuisine),
+        (is_category, RestaurantMenu.menu_category),
+        else_=cast(bucket, String),
+    )
+    stmt = select(kind.label("kind"), value.label("value"), func.count().label("count"))
+    if q:
+        stmt = stmt.where(RestaurantMenu.dish_name.ilike(f"%{_escape_like(q)}%", escape="\\"))
+    if restaurant_id is not None:
+        stmt = stmt.where(RestaurantMenu.restaurant_id == restaurant_id)
+    stmt = stmt.group_by(func.grouping_sets(RestaurantMenu.cuisine, RestaurantMenu.menu_category, bucket))
+    return _facets_from_rows(db.session.execute(stmt), price_bucket)
+
+
+def view_facets(price_bucket: int) -> dict:
+    rows = db.session.execute(text(f"""
+        SELECT CASE WHEN grouping(cuisine) = 0 THEN 'cuisine'
+                    WHEN grouping(menu_category) = 0 THEN 'menu_category'
+                    ELSE 'price' END AS kind,
+               COALESCE(cuisine, menu_category, price_bucket::text) AS value,
+               sum(dishes)::bigint AS count,
+               max(bucket_width) AS bucket_width
+        FROM {FACET_VIEW}
+        GROUP BY GROUPING SETS (cuisine, menu_category, price_bucket)
+    """)).all()
+    if rows and rows[0].bucket_width != price_bucket:
+        raise FacetViewMismatch(
+            f"{FACET_VIEW} uses price buckets of {rows[0].bucket_width}, expected {price_bucket}")
+    return _facets_from_rows(rows, price_bucket)
+
+
+def facet_view_width(conn) -> int | None:
+    """目前 view 的價格區間寬度；view 不存在、是舊版 (沒有 bucket_width) 或沒有資料時回傳 None"""
+    try:
+        with conn.begin_nested():
+            return conn.execute(text(f"SELECT bucket_width FROM {FACET_VIEW} LIMIT 1")).scalar()
+    except ProgrammingError:
+        return None
+
+
+def ensure_facet_view(conn, price_bucket: int) -> None:
+    """建立 view；寬度與設定不同時整個重建"""
+    if facet_view_width(conn) != price_bucket:
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {FACET_VIEW}"))
+    for statement in facet_view_ddl(price_bucket):
+        conn.execute(text(statement))
+
+
+def refresh_facet_view(engine) -> None:
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+            text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {FACET_VIEW}"))
+
+
+class FacetRefresher:
+    """寫入 commit 後排程 REFRESH MATERIALIZED VIEW CONCURRENTLY，短時間內的多次寫入只刷新一次"""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._pid = None
+        self.engine = None
+        self.min_interval = 5.0
+        self.last_refresh = 0.0
+
+    def start(self, app, engine):
+        if app.config["MENU_FACETS_SOURCE"] != "view" or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.engine = engine
+        self.min_interval = app.config["MENU_FACETS_REFRESH_INTERVAL"]
+        threading.Thread(target=self._run, name="facet-refresher", daemon=True).start()
+
+    def schedule(self):
+        if self._pid == os.getpid():
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # 合併間隔內的所有寫入
+            delay = self.last_refresh + self.min_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._wake.clear()
+            try:
+                refresh_facet_view(self.engine)
+            except Exception:
+                logger.exception("refreshing %s failed", FACET_VIEW)
+            self.last_refresh = time.time()
+
+
+facet_refresher = FacetRefresher()
+
+
+def mark_facets_stale():
+    # 在 commit 之後才刷新，才看得到這次寫入的資料
+    db.session.info["facets_stale"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def _refresh_after_commit(session):
+    if session.info.pop("facets_stale", False):
+        facet_refresher.schedule()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("facets_stale", None)
@@ -0,0 +1,100 @@
+"""gevent worker 支援：psycopg2 等待資料庫回應時讓出給其他 greenlet"""
+import sys
+from collections import deque
+import psycopg2
+from psycopg2 import extensions
+
+
+def green_enabled() -> bool:
+    # gunicorn -k gevent 會在載入 app 前 monkey patch 標準庫；沒用 gevent 時不必載入它
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("socket")
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+
+def patch_psycopg() -> bool:
+    """boto3 (socket/ssl) 已由 monkey patch 處理；psycopg2 是 C 擴充，需要另外設定 wait callback"""
+    if not green_enabled():
+        return False
+    extensions.set_wait_callback(_gevent_wait_callback)
+    return True
+
+
+
+class RequestGate:
+    """限制同時處理的請求數，額滿時依到達順序放行。
+
+    gevent worker 會一次接下上千個連線；若全部直接去搶連線池，釋放出來的連線常被剛進來的
+    greenlet 搶走，等最久的請求一直輪不到 (p99 暴增)。這裡把名額直接交給排最前面的人。
+    """
+
+    def __init__(self, wsgi_app, limit: int):
+        from gevent.event import Event
+        self._event_cls = Event
+        self.wsgi_app = wsgi_app
+        self.available = limit
+        self.waiters = deque()
+
+    def _acquire(self):
+        if self.available > 0 and not self.waiters:
+            self.available -= 1
+            return
+        event = self._event_cls()
+        self.waiters.append(event)
+        try:
+            event.wait()
+        except BaseException:
+            # 等待中被 kill 或 Timeout：還沒輪到就退出隊伍；名額已轉交過來就再交給下一位
+            if event.is_set():
+                self._release()
+            else:
+                self.waiters.remove(event)
+            raise
+
+    def _release(self):
+        if self.waiters:
+            # 名額直接轉交，不經過 available 以免被插隊
+            self.waiters.popleft().set()
+        else:
+            self.available += 1
+
+    def __call__(self, environ, start_response):
+        self._acquire()
+        try:
+            body = self.wsgi_app(environ, start_response)
+        except BaseException:
+            self._release()
+            raise
+        return _ReleasingIterable(body, self._release)
+
+
+class _ReleasingIterable:
+    """串流回應要等 body 傳送完 (close) 才歸還名額"""
+
+    def __init__(self, body, release):
+        self.body = body
+        self.release = release
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.release()
@@ -1,9 +1,15 @@
 import os
+import threading
+import time
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-import boto3
+from auth import role_required
+from cache import TTLCache
+from metrics import timed_call
+from presign import SigV4Presigner
 
 load_dotenv()
 
@@ -15,40 +21,100 @@ R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
 R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
 BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
 EXPIRY = 15*60
-
-s3 = boto3.client(
-    service_name="s3",
-    endpoint_url=R2_ENDPOINT_URL,
-    aws_access_key_id=R2_ACCESS_KEY_ID,
-    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-    region_name="auto",  # Must be one of: wnam, enam, weur, eeur, apac, auto
+# GET URL 快取：回傳的 URL 至少還有這麼多秒可用
+PRESIGN_GET_MIN_REMAINING = int(os.getenv("PRESIGN_GET_MIN_REMAINING", "300"))
+PRESIGN_GET_CACHE_SIZE = int(os.getenv("PRESIGN_GET_CACHE_SIZE", "10000"))
+
+_s3 = None
+_s3_lock = threading.Lock()
+
+
+def get_s3_client():
+    """boto3 載入與建立 client 要上百毫秒，只有真的用到時才建立"""
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                import boto3
+
+                _s3 = boto3.client(
+                    service_name="s3",
+                    endpoint_url=R2_ENDPOINT_URL,
+                    aws_access_key_id=R2_ACCESS_KEY_ID,
+                    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+                    region_name="auto",  # Must be one of: wnam, enam, weur, eeur, apac, auto
+                )
+    return _s3
+
+# 本地計算 SigV4 簽章，一次簽多個 key；沒有設定金鑰時退回 boto3
+presigner = (
+    SigV4Presigner(R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_ENDPOINT_URL, BUCKET_NAME, "auto")
+    if R2_ACCESS_KEY_ID and R2_SECRET_ACCESS_KEY and R2_ENDPOINT_URL and BUCKET_NAME
+    else None
 )
 
+_CLIENT_METHODS = {"GET": "get_object", "PUT": "put_object", "DELETE": "delete_object"}
+
+
+@timed_call("presign")
+def presign_many(method: str, keys: list[str], signed_at: datetime | None = None) -> list[str]:
+    if presigner is not None:
+        return presigner.presign_many(method, keys, EXPIRY, signed_at)
+    s3 = get_s3_client()
+    return [
+        s3.generate_presigned_url(
+            _CLIENT_METHODS[method],
+            Params={"Bucket": BUCKET_NAME, "Key": key},
+            ExpiresIn=EXPIRY,
+        )
+        for key in keys
+    ]
+
+
+# 以時間分桶：同一個桶內都用桶的起點當簽章時間，
+# 所以每個 worker 對同一個 key 會產生完全相同的 URL，瀏覽器/CDN 快取也能命中
+_GET_BUCKET_SECONDS = max(1, EXPIRY - PRESIGN_GET_MIN_REMAINING)
+get_url_cache = TTLCache(PRESIGN_GET_CACHE_SIZE)
+get_url_stats = {"hits": 0, "misses": 0}
+
+
+def current_url_bucket() -> int:
+    return int(time.time() // _GET_BUCKET_SECONDS * _GET_BUCKET_SECONDS)
+
 
-def _presign_put(key: str):
-    return s3.generate_presigned_url(
-        "put_object",
-        Params={"Bucket": BUCKET_NAME, "Key": key},
-        ExpiresIn=EXPIRY,
-    )
+def presign_get_cached(keys: list[str]) -> list[str]:
+    bucket_start = current_url_bucket()
+    expires_at = bucket_start + _GET_BUCKET_SECONDS
 
+    urls = [get_url_cache.get((key, bucket_start)) for key in keys]
+    missing = [key for key, url in zip(keys, urls) if url is None]
+    get_url_stats["hits"] += len(keys) - len(missing)
+    get_url_stats["misses"] += len(missing)
+    if not missing:
+        return urls
 
-def _presign_delete(key: str):
-    return s3.generate_presigned_url(
-        "delete_object",
-        Params={"Bucket": BUCKET_NAME, "Key": key},
-        ExpiresIn=EXPIRY,
-    )
+    signed_at = datetime.fromtimestamp(bucket_start, timezone.utc)
+    fresh = dict(zip(missing, presign_many("GET", missing, signed_at)))
+    for key, url in fresh.items():
+        get_url_cache.set((key, bucket_start), url, expires_at)
+    return [url if url is not None else fresh[key] for key, url in zip(keys, urls)]
 
-def _presign_get(key: str) -> str:
-    return s3.generate_presigned_url(
-        "get_object",
-        Params={
-            "Bucket": BUCKET_NAME,
-            "Key": key,
-        },
-        ExpiresIn=EXPIRY,
-    )
+
+def wants_image_urls() -> bool:
+    # 讀取端點的 opt-in 參數：?include_image_urls=true
+    return request.args.get("include_image_urls", "").lower() in ("1", "true", "yes")
+
+
+def attach_image_urls(views) -> None:
+    """替每個有 image_key 的 view 填上 image_url，整批只簽一次"""
+    signed = [view for view in views if view.image_key]
+    urls = presign_get_cached([view.image_key for view in signed])
+    for view, url in zip(signed, urls):
+        view.image_url = url
+
+
+def _valid_keys(keys) -> list[str]:
+    return [key for key in keys if key is not None and isinstance(key, str)]
 
 
 
@@ -61,11 +127,9 @@ def presigned_upload():
     files = request.json.get("files")
     if not isinstance(files, list):
         files = [files]
-    urls = []
-    for data in files:
-        key = data['name']  # e.g. "restaurant_name/xxx.png"
-        urls.append({"key": key, "url": _presign_put(key)})
-    return jsonify(urls)
+    keys = [data['name'] for data in files]  # e.g. "restaurant_name/xxx.png"
+    urls = presign_many("PUT", keys)
+    return jsonify([{"key": key, "url": url} for key, url in zip(keys, urls)])
 
 
 @image_bp.route("/presigned/update", methods=["POST"])
@@ -77,11 +141,9 @@ def presigned_update():
     keys = datas.get("keys")             # ["uploads/xxx.png", ...]
     if not isinstance(keys, list):
         keys = [keys]
-    urls = []
-    for key in keys:
-        if key is not None and isinstance(key, str):
-            urls.append({"key": key, "url": _presign_put(key)})
-    return jsonify(urls)
+    keys = _valid_keys(keys)
+    urls = presign_many("PUT", keys)
+    return jsonify([{"key": key, "url": url} for key, url in zip(keys, urls)])
 
 
 @image_bp.route("/presigned/delete", methods=["POST"])
@@ -93,11 +155,9 @@ def presigned_delete():
     keys = datas.get("keys")             # ["uploads/xxx.png", ...]
     if not isinstance(keys, list):
         keys = [keys]
-    urls = []
-    for key in keys:
-        if key is not None and isinstance(key, str):
-            urls.append({"key": key, "url": _presign_delete(key)})
-    return jsonify(urls)
+    keys = _valid_keys(keys)
+    urls = presign_many("DELETE", keys)
+    return jsonify([{"key": key, "url": url} for key, url in zip(keys, urls)])
 
 @image_bp.route("/presigned/get", methods=["POST"])
 @jwt_required()
@@ -108,8 +168,16 @@ def presigned_get():
     keys = datas.get("keys")             # ["uploads/xxx.png", ...]
     if not isinstance(keys, list):
         keys = [keys]
-    urls = []
-    for key in keys:
-        if key is not None and isinstance(key, str):
-            urls.append( _presign_get(key))
-    return jsonify({ "urls": urls })
\ No newline at end of file
+    urls = presign_get_cached(_valid_keys(keys))
+    return jsonify({ "urls": urls })
+
+
+@image_bp.route("/presigned/cache-stats", methods=["GET"])
+@jwt_required()
+@role_required("admin")
+def presigned_cache_stats():
+    return jsonify({
+        "hits": get_url_stats["hits"],
+        "misses": get_url_stats["misses"],
+        "size": len(get_url_cache),
+    })
\ No newline at end of file
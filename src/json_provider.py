@@ -0,0 +1,84 @@
+"""以 orjson / msgspec 取代標準庫 json 的 Flask JSON provider，沒有安裝時退回標準庫"""
+import abc
+import typing as t
+from datetime import date, datetime, time, timedelta
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 選用相依套件
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # 選用相依套件
+    msgspec = None
+
+
+def _default(o: t.Any) -> t.Any:
+    # msgspec 的 datetime 不經過 enc_hook，其他後端一律輸出與它相同的 RFC 3339 (UTC 寫成 Z)
+    if isinstance(o, (datetime, time)) and o.utcoffset() == timedelta(0):
+        return o.isoformat().removesuffix("+00:00") + "Z"
+    if isinstance(o, (date, time)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """標準庫 json，日期格式與 orjson / msgspec 一致"""
+
+    default = staticmethod(_default)
+
+
+class _FastJSONProvider(StdlibJSONProvider, metaclass=abc.ABCMeta):
+    """子類別只需要實作 dumps_bytes / loads；UUID、Decimal 由底層函式庫直接編碼"""
+
+    @abc.abstractmethod
+    def dumps_bytes(self, obj: t.Any) -> bytes:
+        ...
+
+    def dumps(self, obj: t.Any, **kwargs: t.Any) -> str:
+        if kwargs:
+            # 呼叫端要求特殊參數 (indent 等) 時交給標準庫處理
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def response(self, *args: t.Any, **kwargs: t.Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(obj)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+class OrjsonProvider(_FastJSONProvider):
+    def dumps_bytes(self, obj: t.Any) -> bytes:
+        # 日期交給 _default，格式才會和其他後端相同
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def loads(self, s: str | bytes, **kwargs: t.Any) -> t.Any:
+        return orjson.loads(s)
+
+
+class MsgspecProvider(_FastJSONProvider):
+    def __init__(self, app):
+        super().__init__(app)
+        self._encoder = msgspec.json.Encoder(
+            enc_hook=self.default, order="sorted" if self.sort_keys else None)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps_bytes(self, obj: t.Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, s: str | bytes, **kwargs: t.Any) -> t.Any:
+        return self._decoder.decode(s)
+
+
+def make_json_provider(app, backend: str = "auto") -> DefaultJSONProvider:
+    if backend in ("auto", "msgspec") and msgspec is not None:
+        return MsgspecProvider(app)
+    if backend in ("auto", "orjson") and orjson is not None:
+        return OrjsonProvider(app)
+    return StdlibJSONProvider(app)
@@ -0,0 +1,78 @@
+"""每家餐廳菜單的預先產生回應：寫入時在同一個 transaction 內重建，讀取時一次主鍵查詢直接送出"""
+import json
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from catalog import menus_by_restaurant
+from json_provider import StdlibJSONProvider
+from models import db, Restaurant, RestaurantMenuSnapshot
+from schemas import restaurant_menu_payload
+
+
+def snapshots_enabled() -> bool:
+    return current_app.config["MENU_SNAPSHOT_ENABLED"]
+
+
+def encode_menu_snapshot(payload: dict) -> bytes:
+    """固定的編碼方式：快照內容不隨安裝的 JSON provider (msgspec / orjson / 標準庫) 改變"""
+    body = json.dumps(payload, default=StdlibJSONProvider.default, ensure_ascii=False,
+                      sort_keys=True, separators=(",", ":"))
+    return body.encode() + b"\n"
+
+
+def load_menu_snapshot(restaurant_id) -> bytes | None:
+    return db.session.execute(
+        select(RestaurantMenuSnapshot.body).where(RestaurantMenuSnapshot.restaurant_id == restaurant_id)
+    ).scalar()
+
+
+def write_menu_snapshots(session, restaurant_ids) -> int:
+    """重建指定餐廳的快照；已刪除的餐廳由 ON DELETE CASCADE 帶走快照"""
+    restaurant_ids = list(restaurant_ids)
+    if not restaurant_ids:
+        return 0
+    restaurants = session.execute(
+        select(Restaurant.id, Restaurant.restaurant_name).where(Restaurant.id.in_(restaurant_ids))
+    ).all()
+    if not restaurants:
+        return 0
+    menus = menus_by_restaurant(session, [r.id for r in restaurants])
+    rows = []
+    for r in restaurants:
+        payload = restaurant_menu_payload(r.restaurant_name, menus.get(r.id, []), False, False)
+        rows.append({"restaurant_id": r.id, "body": encode_menu_snapshot(payload)})
+    stmt = pg_insert(RestaurantMenuSnapshot).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RestaurantMenuSnapshot.restaurant_id],
+        set_={"body": stmt.excluded.body, "updated_at": func.now()},
+    )
+    session.execute(stmt)
+    return len(rows)
+
+
+def rebuild_all_menu_snapshots(session, batch_size: int = 500) -> int:
+    written = 0
+    ids = session.execute(select(Restaurant.id).order_by(Restaurant.id)).scalars().all()
+    for start in range(0, len(ids), batch_size):
+        written += write_menu_snapshots(session, ids[start:start + batch_size])
+        session.commit()
+    return written
+
+
+def mark_menu_snapshots_stale(restaurant_ids) -> None:
+    if restaurant_ids and snapshots_enabled():
+        db.session.info.setdefault("stale_menu_snapshots", set()).update(restaurant_ids)
+
+
+@event.listens_for(db.session, "before_commit")
+def _rebuild_before_commit(session):
+    restaurant_ids = session.info.pop("stale_menu_snapshots", None)
+    if restaurant_ids:
+        # 先 flush，讓重建時看得到這次的新增 / 修改
+        session.flush()
+        write_menu_snapshots(session, restaurant_ids)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("stale_menu_snapshots", None)
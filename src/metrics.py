@@ -0,0 +1,443 @@
+"""每個請求的 SQL 次數、DB / 簽章 / 序列化時間；輸出 Server-Timing 與跨 worker 彙總的 Prometheus /metrics"""
+import atexit
+import fcntl
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from flask import Blueprint, Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+metrics_bp = Blueprint("metrics", __name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.durations = {"db": 0.0, "presign": 0.0, "serialize": 0.0}
+        self.statements = Counter()
+        self.status = 500
+
+    def add_query(self, statement: str, elapsed: float, batched: bool = False):
+        self.sql_count += 1
+        self.durations["db"] += elapsed
+        # 參數已經是 bind 參數，同一段 SELECT 重複出現就是逐筆載入；
+        # 批次寫入與 IN (...) 分批查詢 (串流 /with-menus、selectinload) 不算
+        if not batched and statement.lstrip()[:6].upper() == "SELECT":
+            self.statements[statement] += 1
+
+    def repeated_statement(self, threshold: int) -> tuple[str, int] | None:
+        if not self.statements:
+            return None
+        statement, count = self.statements.most_common(1)[0]
+        return (statement, count) if count >= threshold else None
+
+
+def _current() -> RequestTimings | None:
+    if not has_request_context():
+        return None
+    return g.get("perf")
+
+
+class timed:
+    """with timed("presign"): ... 把耗時累加到目前請求；請求外呼叫時不做任何事"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.perf = _current()
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.perf is not None:
+            self.perf.durations[self.name] += time.perf_counter() - self.started
+
+
+def timed_call(name: str):
+    """裝飾器版本的 timed"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._perf_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    perf = _current()
+    started = getattr(context, "_perf_started", None)
+    if perf is not None and started is not None:
+        perf.add_query(statement, time.perf_counter() - started, executemany or _expanding_in(context))
+
+
+def _expanding_in(context) -> bool:
+    compiled = getattr(context, "compiled", None)
+    return compiled is not None and any(b.expanding for b in compiled.binds.values())
+
+
+def _process_start(pid: int) -> str | None:
+    """行程的啟動時間 (開機後的 clock ticks)；pid 被重複使用時可以分辨；沒有 /proc 時回傳 None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # comm 可能含空白，從最後一個 ")" 之後開始算欄位
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def _worker_alive(pid: int, started: str) -> bool:
+    current = _process_start(pid)
+    if current is not None:
+        return current == started
+    return _pid_alive(pid)
+
+
+class MetricsStore:
+    """每個 worker 在記憶體累計，定期寫到共用目錄下自己的檔案；/metrics 讀取所有檔案加總"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[tuple, float] = {}
+        self.histograms: dict[tuple, list] = {}
+        self.directory = None
+        self.flush_interval = 1.0
+        self._flushed_at = 0.0
+        self._pid = None
+        self._filename = None
+
+    def configure(self, directory: str, flush_interval: float):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        # 結束前把最後一段計數寫出去，之後由 archive 收進來
+        atexit.register(self.flush)
+
+    def _worker_file(self) -> str:
+        # gunicorn fork 之後 pid 會變，檔名要在 worker 內決定
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            started = _process_start(pid) or str(int(time.time()))
+            self._filename = f"worker-{pid}-{started}.json"
+        return os.path.join(self.directory, self._filename)
+
+    def inc(self, name: str, labels: tuple, value: float = 1.0):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        key = (name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                # 各 bucket 的次數 (非累積) + sum + count
+                hist = self.histograms[key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            hist[-2] += value
+            hist[-1] += 1
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.directory is None:
+            return
+        self._flushed_at = time.monotonic()
+        with self._lock:
+            payload = {
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "histograms": [[n, list(l), h] for (n, l), h in self.histograms.items()],
+            }
+        payload["gauges"], component_counters = _component_stats()
+        payload["counters"].extend(component_counters)
+        path = self._worker_file()
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+
+
+metrics_store = MetricsStore()
+
+
+def _component_stats() -> tuple[list, list]:
+    """既有的各元件統計：回傳 (gauges, counters)"""
+    from db_pool import pool_stats
+    from image_manager import get_url_cache, get_url_stats
+    from passwords import password_hasher
+    from revocation import revocation_cache
+
+    gauges, counters = [], []
+    pool = pool_stats.snapshot()
+    for key in ("size", "in_use", "idle", "overflow"):
+        if key in pool:
+            gauges.append([f"db_pool_{key}", [], pool[key]])
+    counters += [
+        ["db_pool_checkouts_total", [], pool["checkouts"]],
+        ["db_pool_timeouts_total", [], pool["timeouts"]],
+        ["db_pool_errors_total", [], pool["errors"]],
+        ["db_pool_wait_seconds_total", [], pool["wait_seconds_total"]],
+    ]
+    counters += [[f"presign_get_cache_{k}_total", [], v] for k, v in get_url_stats.items()]
+    gauges.append(["presign_get_cache_entries", [], len(get_url_cache)])
+    stats = revocation_cache.stats
+    counters += [[f"token_{k}_total", [], stats[k]]
+                 for k in ("bloom_negatives", "bloom_positives", "bloom_false_positives")]
+    gauges += [
+        ["token_live_revoked", [], stats["live_revoked"]],
+        ["token_blocklist_rows", [], stats["table_rows"]],
+        ["token_revoked_cache_entries", [], len(revocation_cache.revoked)],
+        ["token_accepted_cache_entries", [], len(revocation_cache.accepted)],
+        ["token_bloom_false_positive_rate", [], revocation_cache.false_positive_rate()],
+    ]
+    hashing = password_hasher.snapshot()
+    counters += [[f"password_{k}_total", [], hashing[k]]
+                 for k in ("hash", "verify", "rehash", "rejected", "timeout")]
+    counters.append(["password_hash_seconds_total", [], hashing["latency_seconds_total"]])
+    gauges.append(["password_hash_queue_depth", [], hashing["queue_depth"]])
+    return gauges, counters
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+_LABEL_NAMES = {
+    "http_requests_total": ("endpoint", "method", "status"),
+    "http_request_duration_seconds": ("endpoint",),
+    "http_sql_statements_total": ("endpoint",),
+    "http_db_seconds_total": ("endpoint",),
+    "http_presign_seconds_total": ("endpoint",),
+    "http_serialize_seconds_total": ("endpoint",),
+    "http_n_plus_one_total": ("endpoint",),
+}
+
+
+def _add_counters(counters: dict, histograms: dict, payload: dict) -> None:
+    for name, labels, value in payload["counters"]:
+        key = (name, tuple(labels))
+        counters[key] = counters.get(key, 0.0) + value
+    for name, labels, hist in payload["histograms"]:
+        key = (name, tuple(labels))
+        total = histograms.setdefault(key, [0] * len(hist))
+        for i, value in enumerate(hist):
+            total[i] += value
+
+
+def _worker_files(directory: str) -> list[tuple[str, int, str]]:
+    files = []
+    for path in glob.glob(os.path.join(directory, "worker-*.json")):
+        try:
+            pid, started = os.path.basename(path)[len("worker-"):-len(".json")].split("-")
+            files.append((path, int(pid), started))
+        except ValueError:
+            continue
+    return files
+
+
+def archive_dead_workers(directory: str) -> None:
+    """已結束 worker 的計數器併進 archive.json 後刪除檔案 (Prometheus 計數器不能倒退)"""
+    dead = [(path, pid, started) for path, pid, started in _worker_files(directory)
+            if not _worker_alive(pid, started)]
+    if not dead:
+        return
+    archive_path = os.path.join(directory, "archive.json")
+    with open(os.path.join(directory, "archive.lock"), "w") as lock:
+        # 多個 worker 同時處理 /metrics 時只讓一個合併
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(archive_path) as f:
+                archive = json.load(f)
+        except (OSError, ValueError):
+            archive = {"counters": [], "histograms": [], "folded": []}
+        counters: dict[tuple, float] = {}
+        histograms: dict[tuple, list] = {}
+        _add_counters(counters, histograms, archive)
+        # folded 記錄已經合併的檔名：寫完 archive 之後、刪檔之前中斷也不會重複計算
+        folded = set(archive["folded"])
+        for path, _, _ in dead:
+            name = os.path.basename(path)
+            if name in folded:
+                continue
+            try:
+                with open(path) as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                continue
+            _add_counters(counters, histograms, payload)
+            folded.add(name)
+        archive = {
+            "counters": [[n, list(l), v] for (n, l), v in counters.items()],
+            "histograms": [[n, list(l), h] for (n, l), h in histograms.items()],
+            "folded": sorted(n for n in folded if os.path.exists(os.path.join(directory, n))),
+        }
+        tmp = f"{archive_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(archive, f)
+        os.replace(tmp, archive_path)
+        for path, _, _ in dead:
+            if os.path.basename(path) in folded:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def render_prometheus(directory: str) -> str:
+    archive_dead_workers(directory)
+    counters: dict[tuple, float] = {}
+    histograms: dict[tuple, list] = {}
+    gauges = []
+    try:
+        with open(os.path.join(directory, "archive.json")) as f:
+            archive = json.load(f)
+    except (OSError, ValueError):
+        archive = None
+    if archive is not None:
+        _add_counters(counters, histograms, archive)
+    folded = set(archive["folded"]) if archive is not None else set()
+    for path, pid, started in _worker_files(directory):
+        if os.path.basename(path) in folded:
+            continue
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            continue
+        _add_counters(counters, histograms, payload)
+        if _worker_alive(pid, started):
+            gauges += [(name, labels, value, pid) for name, labels, value in payload["gauges"]]
+
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(_LABEL_NAMES.get(name, ()), labels)} {value:g}")
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        names = _LABEL_NAMES.get(name, ())
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, hist):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(names + ('le',), (*labels, bound))} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(names + ('le',), (*labels, '+Inf'))} {hist[-1]}")
+        lines.append(f"{name}_sum{_labels(names, labels)} {hist[-2]:g}")
+        lines.append(f"{name}_count{_labels(names, labels)} {hist[-1]}")
+    for name, labels, value, pid in sorted(gauges):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_labels(('worker',), (pid,))} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def _before_request():
+    g.perf = RequestTimings()
+
+
+def _after_request(resp):
+    perf = g.get("perf")
+    if perf is None:
+        return resp
+    perf.status = resp.status_code
+    if current_app.config["METRICS_SERVER_TIMING"]:
+        # 串流回應的 header 在產生內容前就送出，只包含到目前為止的時間
+        d = perf.durations
+        resp.headers["Server-Timing"] = ", ".join([
+            f'db;dur={d["db"] * 1000:.2f};desc="{perf.sql_count} queries"',
+            f"presign;dur={d['presign'] * 1000:.2f}",
+            f"serialize;dur={d['serialize'] * 1000:.2f}",
+            f"app;dur={(time.perf_counter() - perf.started) * 1000:.2f}",
+        ])
+    return resp
+
+
+def _teardown_request(exc):
+    perf = g.pop("perf", None)
+    if perf is None:
+        return
+    endpoint = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    labels = (endpoint,)
+    status = 500 if exc is not None else perf.status
+    metrics_store.inc("http_requests_total", (endpoint, request.method, str(status)))
+    metrics_store.observe("http_request_duration_seconds", labels, time.perf_counter() - perf.started)
+    metrics_store.inc("http_sql_statements_total", labels, perf.sql_count)
+    for name, value in perf.durations.items():
+        metrics_store.inc(f"http_{name}_seconds_total", labels, value)
+    repeated = perf.repeated_statement(current_app.config["METRICS_N_PLUS_ONE_THRESHOLD"])
+    if repeated is not None:
+        metrics_store.inc("http_n_plus_one_total", labels)
+        statement, count = repeated
+        logger.warning("possible N+1 on %s %s: %d executions of %s",
+                       request.method, endpoint, count, " ".join(statement.split())[:200])
+    metrics_store.maybe_flush()
+
+
+def install_metrics(app):
+    if not app.config["METRICS_ENABLED"]:
+        return
+    metrics_store.configure(app.config["METRICS_DIR"], app.config["METRICS_FLUSH_INTERVAL"])
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    # jsonify 的編碼時間
+    app.json.response = timed_call("serialize")(app.json.response)
+    app.register_blueprint(metrics_bp)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    token = current_app.config["METRICS_TOKEN"]
+    if not token:
+        # 沒有設定 token 時不對外公開
+        return Response("metrics disabled: set METRICS_TOKEN\n", status=404, mimetype="text/plain")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    metrics_store.flush()
+    body = render_prometheus(metrics_store.directory)
+    return Response(body, mimetype="text/plain; version=0.0.4")
@@ -1,7 +1,7 @@
 import uuid
 from decimal import Decimal
 from datetime import datetime
-from sqlalchemy import String, DateTime, UUID, func, NUMERIC, Integer
+from sqlalchemy import String, DateTime, UUID, func, NUMERIC, Integer, BigInteger, DDL, LargeBinary, event
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.orm import DeclarativeBase
@@ -54,6 +54,18 @@ class User(db.Model):
 
 class Restaurant(db.Model):
     __tablename__ = "restaurant"  # 指定資料表名稱
+    __table_args__ = (
+        # keyset 分頁：ORDER BY created_at, id
+        db.Index("ix_restaurant_created_at_id", "created_at", "id"),
+        # 增量同步：WHERE updated_at >= since ORDER BY updated_at, id
+        db.Index("ix_restaurant_updated_at_id", "updated_at", "id"),
+        # 餐廳名稱前綴搜尋 (LIKE 'abc%')
+        db.Index(
+            "ix_restaurant_name_prefix",
+            "restaurant_name",
+            postgresql_ops={"restaurant_name": "text_pattern_ops"},
+        ),
+    )
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid(), nullable=False)
     restaurant_name: Mapped[str] = mapped_column(
@@ -87,6 +99,22 @@ class Restaurant(db.Model):
 
 class RestaurantMenu(db.Model):
     __tablename__ = "restaurant_menu"  # 指定資料表名稱
+    __table_args__ = (
+        # 依餐廳讀菜單 (ORDER BY created_at, id)
+        db.Index("ix_restaurant_menu_restaurant_id", "restaurant_id", "created_at", "id"),
+        db.Index("ix_restaurant_menu_updated_at_id", "updated_at", "id"),
+        # 菜名模糊搜尋 (ILIKE '%q%')，需要 pg_trgm
+        db.Index(
+            "ix_restaurant_menu_dish_name_trgm",
+            "dish_name",
+            postgresql_using="gin",
+            postgresql_ops={"dish_name": "gin_trgm_ops"},
+        ),
+        # 搜尋的篩選 + 價格排序 keyset
+        db.Index("ix_restaurant_menu_price_id", "price", "id"),
+        db.Index("ix_restaurant_menu_cuisine_price_id", "cuisine", "price", "id"),
+        db.Index("ix_restaurant_menu_category_price_id", "menu_category", "price", "id"),
+    )
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid(), nullable=False)
     
@@ -111,7 +139,7 @@ class RestaurantMenu(db.Model):
     updated_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
-        server_onupdate=func.now(),
+        onupdate=func.now(),
         nullable=False
     )
     created_at: Mapped[DateTime] = mapped_column(
@@ -136,12 +164,90 @@ class RestaurantMenu(db.Model):
         self.price = price
 
 
+# 評分排序 keyset：rating 可為 NULL，以 0 排序
+db.Index(
+    "ix_restaurant_menu_rating_id",
+    func.coalesce(RestaurantMenu.rating, 0),
+    RestaurantMenu.id,
+)
+
+event.listen(
+    RestaurantMenu.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
+class RestaurantMenuSnapshot(db.Model):
+    """GET /api/restaurant-menus/get/<id> 預設格式的完整回應內容 (JSON bytes)"""
+    __tablename__ = "restaurant_menu_snapshot"
+    restaurant_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), db.ForeignKey("restaurant.id", ondelete="CASCADE"), primary_key=True)
+    body: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 class TokenBlocklist(db.Model):
     __tablename__ = "token_blocklist"
     id: Mapped[int] = mapped_column(primary_key=True)
     jti: Mapped[str] = mapped_column(String(36), nullable=False, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # token 原本的到期時間，過期後即可刪除
+    expires_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True, index=True)
 
-    def __init__(self, jti: str, created_at: datetime):
+    def __init__(self, jti: str, created_at: datetime, expires_at: datetime | None = None):
         self.jti = jti
         self.created_at = created_at
+        self.expires_at = expires_at
+
+
+class CatalogVersion(db.Model):
+    __tablename__ = "catalog_version"
+    # "catalog" 代表整份目錄，其餘為餐廳 id
+    scope: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class CatalogTombstone(db.Model):
+    """刪除紀錄：增量同步用來通知客戶端移除資料，由資料庫 trigger 寫入"""
+    __tablename__ = "catalog_tombstone"
+    __table_args__ = (
+        db.Index("ix_catalog_tombstone_deleted_at", "deleted_at"),
+    )
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # "restaurant" 或 "menu"
+    entity: Mapped[str] = mapped_column(String(16), nullable=False)
+    entity_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    restaurant_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# 用 trigger 而不是 ORM 事件：ON DELETE CASCADE 刪掉的菜單、bulk DELETE 也會留下紀錄
+TOMBSTONE_TRIGGER_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION catalog_record_tombstone() RETURNS trigger AS $$
+    BEGIN
+        IF TG_TABLE_NAME = 'restaurant_menu' THEN
+            INSERT INTO catalog_tombstone (entity, entity_id, restaurant_id)
+            VALUES ('menu', OLD.id, OLD.restaurant_id);
+        ELSE
+            INSERT INTO catalog_tombstone (entity, entity_id) VALUES ('restaurant', OLD.id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS restaurant_tombstone ON restaurant",
+    "CREATE TRIGGER restaurant_tombstone AFTER DELETE ON restaurant "
+    "FOR EACH ROW EXECUTE FUNCTION catalog_record_tombstone()",
+    "DROP TRIGGER IF EXISTS restaurant_menu_tombstone ON restaurant_menu",
+    "CREATE TRIGGER restaurant_menu_tombstone AFTER DELETE ON restaurant_menu "
+    "FOR EACH ROW EXECUTE FUNCTION catalog_record_tombstone()",
+]
+
+# 所有資料表建立後才掛 trigger (create_all 的建表順序不保證 restaurant 在前)
+for _statement in TOMBSTONE_TRIGGER_DDL:
+    event.listen(db.metadata, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
@@ -0,0 +1,53 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values) -> str:
+    """把排序鍵編成不透明的 cursor 字串"""
+    parts = []
+    for v in values:
+        if isinstance(v, datetime):
+            parts.append(v.isoformat())
+        elif isinstance(v, uuid.UUID):
+            parts.append(str(v))
+        else:
+            parts.append(v)
+    raw = json.dumps(parts, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token: str) -> list:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("invalid cursor") from e
+    if not isinstance(parts, list):
+        raise InvalidCursor("invalid cursor")
+    return parts
+
+
+def decode_time_id_cursor(token: str) -> tuple[datetime, uuid.UUID]:
+    parts = decode_cursor(token)
+    if len(parts) != 2:
+        raise InvalidCursor("invalid cursor")
+    try:
+        return datetime.fromisoformat(parts[0]), uuid.UUID(parts[1])
+    except (ValueError, TypeError, AttributeError) as e:
+        raise InvalidCursor("invalid cursor") from e
+
+
+def parse_limit(raw, default: int, maximum: int) -> int:
+    """解析 ?limit=，超過上限時直接截到 maximum"""
+    if raw in (None, ""):
+        return default
+    limit = int(raw)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
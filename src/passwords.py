@@ -0,0 +1,138 @@
+"""密碼雜湊移到獨立的 process pool，避免 KDF 佔住 request 執行緒"""
+import functools
+import threading
+import time
+from concurrent.futures import BrokenExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """排隊中的雜湊工作已達上限"""
+
+
+def _hash(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def _verify(stored_hash: str, password: str, method: str) -> tuple[bool, str | None]:
+    # 驗證成功且參數過時時順便重新雜湊，省一次排隊
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if needs_rehash(stored_hash, method):
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+@functools.lru_cache
+def hash_prefix(method: str) -> str:
+    """method 實際寫進雜湊的參數 ("scrypt" 會展開成 "scrypt:32768:8:1")
+
+    要跑一次 KDF (約 0.1 秒)，每個行程只算一次，且不在啟動時計算
+    """
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def needs_rehash(stored_hash: str, method: str) -> bool:
+    return stored_hash.split("$", 1)[0] != hash_prefix(method)
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.method = "scrypt:32768:8:1"
+        self.workers = 1
+        self.max_queue = 32
+        self.timeout = 10.0
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.stats = {"hash": 0, "verify": 0, "rehash": 0, "rejected": 0, "timeout": 0,
+                      "latency_seconds_total": 0.0, "latency_seconds_max": 0.0}
+
+    def init_app(self, app):
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.max_queue = app.config["PASSWORD_HASH_MAX_QUEUE"]
+        self.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+
+    def _get_executor(self):
+        # 在 gunicorn fork 之後才建立；spawn 避免複製整個 worker (連線池、執行緒)
+        if self._executor is None:
+            # 啟動時用不到，第一次雜湊才載入 multiprocessing
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _done(self, op: str, started: float, cancelled: bool = False) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.pending -= 1
+            if cancelled:
+                # 逾時後被取消、從未執行的工作不計入次數與延遲
+                return
+            self.stats[op] += 1
+            self.stats["latency_seconds_total"] += elapsed
+            self.stats["latency_seconds_max"] = max(self.stats["latency_seconds_max"], elapsed)
+
+    def _run(self, op: str, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise HashingBusy()
+            self.pending += 1
+        started = time.perf_counter()
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._done(op, started)
+        try:
+            with self._lock:
+                executor = self._get_executor()
+            future = executor.submit(fn, *args)
+        except BaseException as e:
+            self._done(op, started)
+            if isinstance(e, BrokenExecutor):
+                with self._lock:
+                    self._executor = None
+            raise
+        # 逾時的工作在子行程做完 (或被取消) 之前仍佔著佇列名額
+        future.add_done_callback(lambda fut: self._done(op, started, fut.cancelled()))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # 還在排隊的工作直接取消；已經開始的只能等它結束
+            future.cancel()
+            with self._lock:
+                self.stats["timeout"] += 1
+            raise
+        except BrokenExecutor:
+            # 子行程異常結束，下次重建
+            with self._lock:
+                self._executor = None
+            raise
+
+    def hash(self, password: str) -> str:
+        return self._run("hash", _hash, password, self.method)
+
+    def verify(self, stored_hash: str, password: str) -> tuple[bool, str | None]:
+        """回傳 (是否正確, 需要寫回的新雜湊或 None)"""
+        ok, new_hash = self._run("verify", _verify, stored_hash, password, self.method)
+        if new_hash is not None:
+            with self._lock:
+                self.stats["rehash"] += 1
+        return ok, new_hash
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "method": self.method.split(":", 1)[0],
+                "workers": self.workers,
+                "queue_depth": self.pending,
+                **{k: round(v, 6) if isinstance(v, float) else v for k, v in self.stats.items()},
+            }
+
+
+password_hasher = PasswordHasher()
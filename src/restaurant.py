@@ -1,9 +1,16 @@
-from flask import Blueprint, request, jsonify
+from datetime import datetime, timezone
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required
+from sqlalchemy import select, tuple_
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import joinedload
 
 from models import db, Restaurant
+from catalog import RESTAURANT_COLUMNS, fetch_restaurants_with_menus, iter_restaurants_with_menus
+from etag import bump_catalog_version, conditional_get
+from image_manager import attach_image_urls, wants_image_urls
+from metrics import timed_call
+from schemas import RestaurantView, serialize_restaurants, wants_compact
+from pagination import InvalidCursor, decode_time_id_cursor, encode_cursor, parse_limit
 restaurant_bp = Blueprint("restaurant", __name__, url_prefix="/api/restaurant")
 
 
@@ -29,6 +36,7 @@ def add_restaurant():
     db.session.add(new_restaurant)
 
     try:
+        bump_catalog_version()
         db.session.commit()
     except IntegrityError as err:
         db.session.rollback()
@@ -43,25 +51,67 @@ def add_restaurant():
 
 @restaurant_bp.route("/all", methods=["GET"])
 @jwt_required()
+@conditional_get()
 def get_all_restaurants():
+    # keyset 分頁：?limit=&cursor=&name_prefix=&updated_since=
     try:
-        restaurants = Restaurant.query.all()
-        restaurant_list = []
-
-        for restaurant in restaurants:
-            restaurant_data = {
-                "id": restaurant.id,
-                "restaurant_name": restaurant.restaurant_name,
-                "image_key": restaurant.image_key,
-                "created_at": restaurant.created_at.isoformat(),
-                "updated_at": restaurant.updated_at.isoformat(),
-            }
-            restaurant_list.append(restaurant_data)
+        limit = parse_limit(
+            request.args.get("limit"),
+            current_app.config["RESTAURANT_PAGE_SIZE"],
+            current_app.config["RESTAURANT_PAGE_SIZE_MAX"],
+        )
+    except ValueError:
+        return jsonify({"msg": "limit must be a positive integer"}), 400
+
+    query = select(*RESTAURANT_COLUMNS)
+
+    name_prefix = request.args.get("name_prefix")
+    if name_prefix:
+        query = query.where(
+            Restaurant.restaurant_name.startswith(name_prefix, autoescape=True))
+
+    updated_since = request.args.get("updated_since")
+    if updated_since:
+        try:
+            since = datetime.fromisoformat(updated_since)
+        except ValueError:
+            return jsonify({"msg": "updated_since must be an ISO 8601 datetime"}), 400
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        query = query.where(Restaurant.updated_at >= since)
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            after_created_at, after_id = decode_time_id_cursor(cursor)
+        except InvalidCursor:
+            return jsonify({"msg": "Invalid cursor"}), 400
+        query = query.where(
+            tuple_(Restaurant.created_at, Restaurant.id) > tuple_(after_created_at, after_id))
+
+    try:
+        # 多拿一筆判斷是否還有下一頁
+        restaurants = db.session.execute(
+            query.order_by(Restaurant.created_at, Restaurant.id).limit(limit + 1)
+        ).all()
+        has_more = len(restaurants) > limit
+        restaurants = restaurants[:limit]
+
+        views = [RestaurantView(r) for r in restaurants]
+        with_urls = wants_image_urls()
+        if with_urls:
+            attach_image_urls(views)
+
+        next_cursor = None
+        if has_more:
+            last = restaurants[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
 
         return jsonify({
             "msg": "Restaurants retrieved successfully",
-            "restaurants": restaurant_list,
-            "count": len(restaurant_list)
+            **serialize_restaurants(views, wants_compact(), with_urls),
+            "count": len(views),
+            "next_cursor": next_cursor,
         }), 200
 
     except Exception as e:
@@ -70,24 +120,25 @@ def get_all_restaurants():
 # GET single restaurant by ID
 
 
-@restaurant_bp.route("/<int:restaurant_id>", methods=["GET"])
+@restaurant_bp.route("/<uuid:restaurant_id>", methods=["GET"])
 @jwt_required()
 def get_restaurant(restaurant_id):
     try:
-        restaurant = Restaurant.query.get(restaurant_id)
+        restaurant = db.session.execute(
+            select(*RESTAURANT_COLUMNS).where(Restaurant.id == restaurant_id)
+        ).first()
 
         if not restaurant:
             return jsonify({"msg": "Restaurant not found"}), 404
 
-        restaurant_data = {
-            "id": restaurant.id,
-            "restaurant_name": restaurant.restaurant_name,
-            "image_key": restaurant.image_key,
-        }
+        view = RestaurantView(restaurant)
+        with_urls = wants_image_urls()
+        if with_urls:
+            attach_image_urls([view])
 
         return jsonify({
             "msg": "Restaurant retrieved successfully",
-            "restaurant": restaurant_data
+            "restaurant": view.to_dict(with_urls)
         }), 200
 
     except Exception as e:
@@ -121,6 +172,7 @@ def update_restaurant(restaurant_id):
         if not restaurant.restaurant_name:
             return jsonify({"msg": "Missing required fields: restaurant_name"}), 400
 
+        bump_catalog_version([restaurant_id])
         db.session.commit()
 
         return jsonify({"msg": "Restaurant updated successfully"}), 200
@@ -142,6 +194,7 @@ def delete_restaurant(restaurant_id):
             return jsonify({"msg": "Restaurant not found"}), 404
 
         db.session.delete(restaurant)
+        bump_catalog_version([restaurant_id])
         db.session.commit()
 
         return jsonify({"msg": "Restaurant deleted successfully"}), 200
@@ -153,43 +206,55 @@ def delete_restaurant(restaurant_id):
 
 
 
+def _stream_restaurants_with_menus(fmt: str, batch_size: int, with_urls: bool):
+    # 每次只在記憶體中保留 batch_size 筆餐廳 (及其菜單)
+    dumps = timed_call("serialize")(current_app.json.dumps)
+
+    if fmt == "json":
+        yield '{"msg":"Restaurants with menus retrieved successfully","restaurants":['
+    count = 0
+    for restaurant in iter_restaurants_with_menus(batch_size):
+        if with_urls:
+            attach_image_urls([restaurant, *restaurant.menus])
+        item = dumps(restaurant.to_dict(with_urls))
+        if fmt == "ndjson":
+            yield item + "\n"
+        else:
+            yield ("," if count else "") + item
+        count += 1
+    if fmt == "json":
+        yield f'],"count":{count}}}'
+
+
 @restaurant_bp.route("/with-menus", methods=["GET"])
 @jwt_required()
+@conditional_get()
 def restaurants_with_menus():
-    try:
-        # 使用 joinedload 一次撈取餐廳及其菜單
-        restaurants = (
-            db.session.query(Restaurant)
-            .options(joinedload(Restaurant.restaurant_menu))
-            .all()
+    # ?stream=ndjson | json 逐批輸出；未指定時維持一次回傳完整 JSON
+    stream = request.args.get("stream")
+    if stream:
+        if stream not in ("ndjson", "json"):
+            return jsonify({"msg": "stream must be 'ndjson' or 'json'"}), 400
+        if wants_compact():
+            return jsonify({"msg": "format=compact is not supported with stream"}), 400
+        mimetype = "application/x-ndjson" if stream == "ndjson" else "application/json"
+        return Response(
+            stream_with_context(_stream_restaurants_with_menus(
+                stream, current_app.config["CATALOG_STREAM_BATCH_SIZE"], wants_image_urls())),
+            mimetype=mimetype,
         )
-        # 組裝回傳資料
-        data = []
-        for r in restaurants:
-            data.append({
-                "id": str(r.id),
-                "restaurant_name": r.restaurant_name,
-                "image_key": r.image_key,
-                "created_at": str(r.created_at) if r.created_at else None,
-                "updated_at": str(r.updated_at) if r.updated_at else None,
-                "menus": [
-                    {
-                        "id": str(m.id),
-                        "restaurant_id": str(r.id),
-                        "image_key": m.image_key,
-                        "dish_name": m.dish_name,
-                        "cuisine": m.cuisine,
-                        "menu_category": m.menu_category,
-                        "price": m.price,
-                    }
-                    for m in (r.restaurant_menu or [])
-                ]
-            })
+
+    try:
+        # 只撈需要的欄位，避免 joinedload 的笛卡兒積與 ORM 物件建立
+        views = fetch_restaurants_with_menus()
+        with_urls = wants_image_urls()
+        if with_urls:
+            attach_image_urls(views + [m for r in views for m in r.menus])
 
         return jsonify({
             "msg": "Restaurants with menus retrieved successfully",
-            "restaurants": data,
-            "count": len(data)
+            **serialize_restaurants(views, wants_compact(), with_urls, with_menus=True),
+            "count": len(views)
         }), 200
 
     except Exception as e:
@@ -1,11 +1,46 @@
-from flask import Blueprint, request, jsonify
+import uuid
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 from models import db, Restaurant, RestaurantMenu
+from catalog import SEARCH_SORT_KEYS, fetch_restaurant_menu, parse_sort_value, search_menus
+from etag import bump_catalog_version, conditional_get
+from facets import FacetViewMismatch, live_facets, view_facets
+from image_manager import attach_image_urls, wants_image_urls
+from pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+from menu_snapshot import encode_menu_snapshot, load_menu_snapshot, snapshots_enabled
+from schemas import SearchResultView, restaurant_menu_payload, serialize_menus, wants_compact
 restaurant_menu_bp = Blueprint(
     "restaurant_menu", __name__, url_prefix="/api/restaurant-menus")
 
 
+def _validate_menu_item(data: dict) -> tuple[dict | None, str | None]:
+    """檢查單筆菜單資料，回傳 (欄位, None) 或 (None, 錯誤訊息)"""
+    dish_name = data.get("dish_name")
+    cuisine = data.get("cuisine")
+    menu_category = data.get("menu_category")
+    price_raw = data.get("price")
+
+    if not dish_name or not cuisine or not menu_category:
+        return None, "Missing dish name, or cuisine"
+    if price_raw in (None, ""):
+        return None, "Price is required"
+    try:
+        price = int(price_raw)
+    except (ValueError, TypeError):
+        return None, "Price must be a valid integer"
+
+    return {
+        "image_key": data.get("image_key"),
+        "dish_name": dish_name,
+        "cuisine": cuisine,
+        "menu_category": menu_category,
+        "price": price,
+    }, None
+
+
 @restaurant_menu_bp.route("/add/<uuid:restaurant_id>", methods=["POST"])
 @jwt_required()
 def add_restaurant_menu(restaurant_id):
@@ -19,32 +54,15 @@ def add_restaurant_menu(restaurant_id):
         return jsonify({"msg": "Unsupported Media Type. Expected application/json"}), 415
 
     data = request.get_json(silent=True) or {}
-    image_key = data.get("image_key")
-    dish_name = data.get("dish_name")
-    cuisine = data.get("cuisine")
-    menu_category = data.get("menu_category")
-    price_raw = data.get("price")
-    print("price", price_raw)
+    fields, error = _validate_menu_item(data)
+    if error:
+        return jsonify({"msg": error}), 400
 
-    if not dish_name or not cuisine or not menu_category:
-        return jsonify({"msg": "Missing dish name, or cuisine"}), 400
-    if price_raw in (None, ""):
-        return jsonify({"msg": "Price is required"}), 400
+    new_restaurant_menu = RestaurantMenu(restaurant_id=restaurant_id, **fields)
     try:
-        price = int(price_raw) if price_raw is not None else 0
-    except (ValueError, TypeError):
-        return jsonify({"msg": "Price must be a valid integer"}), 400
-
-    new_restaurant_menu = RestaurantMenu(
-        restaurant_id=restaurant_id,
-        image_key=image_key,
-        dish_name=dish_name,
-        cuisine=cuisine,
-        menu_category=menu_category,
-        price=price
-    )
-    try:
-        restaurant.restaurant_menu.append(new_restaurant_menu)
+        # 直接 add，不要透過 relationship append (會 lazy load 整份菜單)
+        db.session.add(new_restaurant_menu)
+        bump_catalog_version([restaurant_id])
         db.session.commit()
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -53,103 +71,294 @@ def add_restaurant_menu(restaurant_id):
     return jsonify({"msg": "Restaurant menu added successfully"}), 201
 
 
+@restaurant_menu_bp.route("/bulk", methods=["POST"])
+@jwt_required()
+def bulk_upsert_restaurant_menus():
+    # {"restaurant_id": "...", "items": [{...}, ...]}
+    # 每筆 item 可自帶 restaurant_id (多家餐廳) 與 id (有 id 時更新該道菜)
+    if not request.is_json:
+        return jsonify({"msg": "Unsupported Media Type. Expected application/json"}), 415
+
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"msg": "items must be a non-empty list"}), 400
+    max_items = current_app.config["BULK_MENU_MAX_ITEMS"]
+    if len(items) > max_items:
+        return jsonify({"msg": f"At most {max_items} items per request"}), 413
+
+    default_restaurant_id = data.get("restaurant_id")
+    results: list[dict] = [{"index": i} for i in range(len(items))]
+    rows: list[dict] = []
+    row_index: dict[uuid.UUID, int] = {}
+
+    # 1. 先驗證全部資料
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i].update(status="error", msg="Item must be an object")
+            continue
+        fields, error = _validate_menu_item(item)
+        if error is None:
+            try:
+                restaurant_id = uuid.UUID(str(item.get("restaurant_id") or default_restaurant_id))
+                menu_id = uuid.UUID(str(item["id"])) if item.get("id") else uuid.uuid4()
+            except ValueError:
+                error = "Invalid restaurant_id or id"
+        if error is None and menu_id in row_index:
+            error = "Duplicate id in request"
+        if error:
+            results[i].update(status="error", msg=error)
+            continue
+        row_index[menu_id] = i
+        rows.append({"id": menu_id, "restaurant_id": restaurant_id, **fields})
+
+    # 2. 一次查出所有引用到的餐廳
+    restaurant_ids = {row["restaurant_id"] for row in rows}
+    existing = set(db.session.execute(
+        select(Restaurant.id).where(Restaurant.id.in_(restaurant_ids))
+    ).scalars()) if restaurant_ids else set()
+    valid_rows = []
+    for row in rows:
+        if row["restaurant_id"] in existing:
+            valid_rows.append(row)
+        else:
+            results[row_index[row["id"]]].update(status="error", msg="Restaurant not found")
+
+    # 3. 每批一個 multi-row INSERT ... ON CONFLICT (id) DO UPDATE
+    batch_size = current_app.config["BULK_MENU_BATCH_SIZE"]
+    try:
+        # 被更新的菜色原本所屬的餐廳也要更新版本號
+        touched = {row["restaurant_id"] for row in valid_rows}
+        explicit_ids = [row["id"] for row in valid_rows if items[row_index[row["id"]]].get("id")]
+        if explicit_ids:
+            touched.update(db.session.execute(
+                select(RestaurantMenu.restaurant_id).where(RestaurantMenu.id.in_(explicit_ids))
+            ).scalars())
+        for start in range(0, len(valid_rows), batch_size):
+            stmt = pg_insert(RestaurantMenu).values(valid_rows[start:start + batch_size])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[RestaurantMenu.id],
+                set_={
+                    "restaurant_id": stmt.excluded.restaurant_id,
+                    "image_key": stmt.excluded.image_key,
+                    "dish_name": stmt.excluded.dish_name,
+                    "cuisine": stmt.excluded.cuisine,
+                    "menu_category": stmt.excluded.menu_category,
+                    "price": stmt.excluded.price,
+                    "updated_at": func.now(),
+                },
+            ).returning(RestaurantMenu.id, literal_column("(xmax = 0)").label("inserted"))
+            for menu_id, inserted in db.session.execute(stmt):
+                results[row_index[menu_id]].update(
+                    status="created" if inserted else "updated", id=str(menu_id))
+        if valid_rows:
+            bump_catalog_version(touched)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"msg": "Error importing restaurant menus", "error": str(e)}), 500
+
+    counts = {"created": 0, "updated": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return jsonify({
+        "msg": "Bulk import finished",
+        "results": results,
+        **counts,
+    }), 200
+
+
 @restaurant_menu_bp.route("/get/<uuid:restaurant_id>", methods=["GET"])
 @jwt_required()
+@conditional_get(lambda restaurant_id: str(restaurant_id))
 def get_restaurant_menu(restaurant_id):
     try:
-        restaurant = db.session.get(Restaurant, restaurant_id)
-        if restaurant is None:
+        # 預設格式 (沒有 format / include_image_urls) 直接送出寫入時產生的快照
+        from_snapshot = snapshots_enabled() and not request.args
+        if from_snapshot:
+            body = load_menu_snapshot(restaurant_id)
+            if body is not None:
+                return current_app.response_class(body, mimetype="application/json")
+
+        # 單一查詢同時取得餐廳名稱與菜單欄位
+        result = fetch_restaurant_menu(restaurant_id)
+        if result is None:
             return jsonify({"msg": "Restaurant not found"}), 404
-
-        menus = restaurant.restaurant_menu or []        # ← 永遠是 list
-
-        menu_list = [{
-            "id": m.id,
-            "restaurant_name": restaurant.restaurant_name,
-            "restaurant_id": restaurant_id,
-            "image_key": m.image_key,
-            "dish_name": m.dish_name,
-            "cuisine": m.cuisine,
-            "menu_category": m.menu_category,
-            "price": m.price
-        } for m in menus]
-
-        return jsonify({
-            "msg": "Menus retrieved successfully",
-            "menus": menu_list,
-            "count": len(menu_list)
-        }), 200                                         # ← 就算 0 筆也給 200
+        restaurant_name, menus = result
+
+        with_urls = wants_image_urls()
+        if with_urls:
+            attach_image_urls(menus)
+        payload = restaurant_menu_payload(restaurant_name, menus, wants_compact(), with_urls)
+        if from_snapshot:
+            # 快照還沒建好：用與快照相同的編碼，回應不因快照是否存在而不同
+            return current_app.response_class(encode_menu_snapshot(payload), mimetype="application/json")
+        return jsonify(payload), 200                    # ← 就算 0 筆也給 200
     except Exception as e:
         return jsonify({"msg": "Error retrieving menus", "error": str(e)}), 500
 
 
-# UPDATE restaurant
+@restaurant_menu_bp.route("/search", methods=["GET"])
+@jwt_required()
+def search_restaurant_menus():
+    # ?q=&cuisine=&category=&min_price=&max_price=&sort=price|rating&order=asc|desc&limit=&cursor=
+    args = request.args
+    sort = args.get("sort", "price")
+    if sort not in SEARCH_SORT_KEYS:
+        return jsonify({"msg": "sort must be 'price' or 'rating'"}), 400
+    order = args.get("order", "asc")
+    if order not in ("asc", "desc"):
+        return jsonify({"msg": "order must be 'asc' or 'desc'"}), 400
+    try:
+        limit = parse_limit(
+            args.get("limit"),
+            current_app.config["MENU_SEARCH_PAGE_SIZE"],
+            current_app.config["MENU_SEARCH_PAGE_SIZE_MAX"],
+        )
+        min_price = int(args["min_price"]) if args.get("min_price") else None
+        max_price = int(args["max_price"]) if args.get("max_price") else None
+    except ValueError:
+        return jsonify({"msg": "limit, min_price and max_price must be integers"}), 400
+
+    after = None
+    if args.get("cursor"):
+        try:
+            parts = decode_cursor(args["cursor"])
+            # cursor 只能用在產生它的排序方式
+            if len(parts) != 4 or parts[0] != sort or parts[1] != order:
+                raise InvalidCursor("invalid cursor")
+            after = (parse_sort_value(sort, parts[2]), uuid.UUID(parts[3]))
+        except (InvalidCursor, ValueError, TypeError, ArithmeticError):
+            return jsonify({"msg": "Invalid cursor"}), 400
+
+    try:
+        results, next_key = search_menus(
+            q=args.get("q"),
+            cuisine=args.get("cuisine"),
+            category=args.get("category"),
+            min_price=min_price,
+            max_price=max_price,
+            sort=sort,
+            descending=order == "desc",
+            limit=limit,
+            after=after,
+        )
+    except SQLAlchemyError as e:
+        return jsonify({"msg": "Error searching menus", "error": str(e)}), 500
+
+    with_urls = wants_image_urls()
+    if with_urls:
+        attach_image_urls(results)
+    next_cursor = None
+    if next_key is not None:
+        next_cursor = encode_cursor(sort, order, str(next_key[0]), next_key[1])
+
+    return jsonify({
+        "msg": "Menus retrieved successfully",
+        **serialize_menus(results, wants_compact(), with_urls, SearchResultView),
+        "count": len(results),
+        "next_cursor": next_cursor,
+    }), 200
+
+
+@restaurant_menu_bp.route("/facets", methods=["GET"])
+@jwt_required()
+def restaurant_menu_facets():
+    # ?q=&restaurant_id=&price_bucket=  各 cuisine / 分類的菜色數與價格分布
+    args = request.args
+    default_bucket = current_app.config["MENU_FACETS_PRICE_BUCKET"]
+    try:
+        price_bucket = int(args.get("price_bucket", default_bucket))
+        restaurant_id = uuid.UUID(args["restaurant_id"]) if args.get("restaurant_id") else None
+    except ValueError:
+        return jsonify({"msg": "price_bucket must be an integer and restaurant_id a UUID"}), 400
+    if price_bucket <= 0:
+        return jsonify({"msg": "price_bucket must be positive"}), 400
+
+    q = args.get("q")
+    # materialized view 只存了全站、預設價格區間的統計；有篩選時改用即時查詢
+    from_view = (current_app.config["MENU_FACETS_SOURCE"] == "view" and not q
+                 and restaurant_id is None and price_bucket == default_bucket)
+    try:
+        if from_view:
+            try:
+                facets = view_facets(price_bucket)
+            except FacetViewMismatch as e:
+                # 設定改過但 view 還沒重建 (flask catalog upgrade-schema)：先用即時查詢
+                current_app.logger.warning("%s", e)
+                from_view = False
+        if not from_view:
+            facets = live_facets(price_bucket, q=q, restaurant_id=restaurant_id)
+    except SQLAlchemyError as e:
+        return jsonify({"msg": "Error computing menu facets", "error": str(e)}), 500
+
+    return jsonify({
+        "msg": "Menu facets retrieved successfully",
+        "source": "view" if from_view else "live",
+        "price_bucket": price_bucket,
+        **facets,
+    }), 200
+
 
-@restaurant_menu_bp.route("/<int:restaurant_id>", methods=["PUT"])
+# UPDATE restaurant menu
+
+@restaurant_menu_bp.route("/<uuid:menu_id>", methods=["PUT"])
 @jwt_required()
-def update_restaurant(restaurant_id):
+def update_restaurant_menu(menu_id):
     if not request.is_json:
         return jsonify({"msg": "Unsupported Media Type. Expected application/json"}), 415
 
     try:
-        restaurant = Restaurant.query.get(restaurant_id)
+        menu = db.session.get(RestaurantMenu, menu_id)
 
-        if not restaurant:
-            return jsonify({"msg": "Restaurant not found"}), 404
+        if not menu:
+            return jsonify({"msg": "Restaurant menu not found"}), 404
 
         data = request.get_json(silent=True) or {}
 
         # Update fields if provided
-        if "restaurant_name" in data:
-            restaurant.restaurant_name = data["restaurant_name"]
-
-        if "image_keys" in data:
-            restaurant.image_keys = data["image_keys"]
-
-        if "dish_name" in data:
-            restaurant.dish_name = data["dish_name"]
-
-        if "cuisine" in data:
-            restaurant.cuisine = data["cuisine"]
-
-        if "menu_category" in data:
-            restaurant.menu_category = data["menu_category"]
+        for field in ("image_key", "dish_name", "cuisine", "menu_category"):
+            if field in data:
+                setattr(menu, field, data[field])
 
         if "price" in data:
             try:
-                restaurant.price = int(data["price"])
+                menu.price = int(data["price"])
             except (ValueError, TypeError):
                 return jsonify({"msg": "Price must be a valid integer"}), 400
 
         # Validate required fields
-        if not restaurant.restaurant_name or not restaurant.dish_name or not restaurant.cuisine or not restaurant.menu_category:
-            return jsonify({"msg": "Missing required fields: restaurant_name, dish_name, cuisine, or menu_category"}), 400
+        if not menu.dish_name or not menu.cuisine or not menu.menu_category:
+            db.session.rollback()
+            return jsonify({"msg": "Missing required fields: dish_name, cuisine, or menu_category"}), 400
 
+        bump_catalog_version([menu.restaurant_id])
         db.session.commit()
 
-        return jsonify({"msg": "Restaurant updated successfully"}), 200
+        return jsonify({"msg": "Restaurant menu updated successfully"}), 200
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({"msg": "Error updating restaurant", "error": str(e)}), 500
+        return jsonify({"msg": "Error updating restaurant menu", "error": str(e)}), 500
 
-# DELETE restaurant
+# DELETE restaurant menu
 
 
-@restaurant_menu_bp.route("/<int:restaurant_id>", methods=["DELETE"])
+@restaurant_menu_bp.route("/<uuid:menu_id>", methods=["DELETE"])
 @jwt_required()
-def delete_restaurant(restaurant_id):
+def delete_restaurant_menu(menu_id):
     try:
-        restaurant = Restaurant.query.get(restaurant_id)
+        menu = db.session.get(RestaurantMenu, menu_id)
 
-        if not restaurant:
-            return jsonify({"msg": "Restaurant not found"}), 404
+        if not menu:
+            return jsonify({"msg": "Restaurant menu not found"}), 404
 
-        db.session.delete(restaurant)
+        db.session.delete(menu)
+        bump_catalog_version([menu.restaurant_id])
         db.session.commit()
 
-        return jsonify({"msg": "Restaurant deleted successfully"}), 200
+        return jsonify({"msg": "Restaurant menu deleted successfully"}), 200
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({"msg": "Error deleting restaurant", "error": str(e)}), 500
+        return jsonify({"msg": "Error deleting restaurant menu", "error": str(e)}), 500
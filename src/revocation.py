@@ -0,0 +1,257 @@
+"""JWT 撤銷 (logout) 狀態的行程內快取，以及跨 worker 的失效通知"""
+import hashlib
+import logging
+import math
+import os
+import select
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, func, or_, select as sa_select
+from cache import TTLCache
+from models import TokenBlocklist
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """固定大小的 Bloom filter；不在 filter 內的 jti 一定沒有被撤銷"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationCache:
+    """
+    revoked:  jti -> True，保留到 token 的 exp 為止
+    accepted: (jti, exp) -> False，最多保留 negative_ttl 秒，
+              避免其他 instance 撤銷後通知遺失時無限期放行
+    """
+
+    def __init__(self, maxsize: int = 10000, negative_ttl: int = 60):
+        self.revoked = TTLCache(maxsize)
+        self.accepted = TTLCache(maxsize)
+        self.negative_ttl = negative_ttl
+        # 只有在 LISTEN 執行緒運作時才會載入；None 代表每次都要查 DB
+        self.bloom: BloomFilter | None = None
+        self.bloom_built_at = 0.0
+        # gthread 下多個請求執行緒同時累加
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "bloom_negatives": 0,        # 不查 DB 直接放行
+            "bloom_positives": 0,        # filter 命中，需查 DB 確認
+            "bloom_false_positives": 0,  # 查 DB 後發現其實沒被撤銷
+            "live_revoked": 0,
+            "table_rows": 0,
+        }
+
+    def configure(self, maxsize: int, negative_ttl: int):
+        self.revoked.maxsize = maxsize
+        self.accepted.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def lookup(self, jti: str, exp: int | None) -> bool | None:
+        if self.revoked.get(jti):
+            return True
+        if exp is not None and self.accepted.get((jti, exp)) is False:
+            return False
+        bloom = self.bloom
+        if bloom is not None and jti not in bloom:
+            self._count("bloom_negatives")
+            return False
+        return None
+
+    def record_db_result(self, revoked: bool):
+        if self.bloom is None:
+            return
+        with self._stats_lock:
+            self.stats["bloom_positives"] += 1
+            if not revoked:
+                self.stats["bloom_false_positives"] += 1
+
+    def false_positive_rate(self) -> float:
+        with self._stats_lock:
+            positives = self.stats["bloom_positives"]
+            checks = positives + self.stats["bloom_negatives"]
+            return self.stats["bloom_false_positives"] / checks if checks else 0.0
+
+    def mark_revoked(self, jti: str, exp: int | None):
+        # exp 之後 token 本身就失效了，不需要再記住
+        expires_at = exp if exp is not None else time.time() + self.negative_ttl
+        self.revoked.set(jti, True, expires_at)
+        if exp is not None:
+            self.accepted.pop((jti, exp))
+        bloom = self.bloom
+        if bloom is not None:
+            bloom.add(jti)
+
+    def mark_active(self, jti: str, exp: int | None):
+        if exp is None:
+            return
+        expires_at = min(exp, time.time() + self.negative_ttl)
+        self.accepted.set((jti, exp), False, expires_at)
+
+    def invalidate(self):
+        self.accepted.clear()
+        self.bloom = None
+
+
+revocation_cache = RevocationCache()
+
+
+def _live_condition(now: datetime, max_lifetime: timedelta):
+    # 舊資料沒有 expires_at，以 refresh token 最長效期推算
+    return or_(
+        TokenBlocklist.expires_at > now,
+        (TokenBlocklist.expires_at.is_(None)) & (TokenBlocklist.created_at > now - max_lifetime),
+    )
+
+
+def rebuild_bloom(engine, max_lifetime: timedelta, capacity: int, error_rate: float):
+    now = datetime.now(timezone.utc)
+    with engine.connect() as conn:
+        jtis = conn.execute(
+            sa_select(TokenBlocklist.jti).where(_live_condition(now, max_lifetime))
+        ).scalars().all()
+        table_rows = conn.execute(sa_select(func.count(TokenBlocklist.id))).scalar_one()
+    bloom = BloomFilter(max(capacity, len(jtis) * 2), error_rate)
+    for jti in jtis:
+        bloom.add(jti)
+    revocation_cache.bloom = bloom
+    revocation_cache.bloom_built_at = time.time()
+    revocation_cache.stats["live_revoked"] = len(jtis)
+    revocation_cache.stats["table_rows"] = table_rows
+
+
+def prune_expired(session, max_lifetime: timedelta) -> int:
+    """刪除已過期 token 的 blocklist 資料，回傳刪除筆數"""
+    now = datetime.now(timezone.utc)
+    # 不能寫成 NOT _live_condition：expires_at 為 NULL 時 SQL 三值邏輯會得到 NULL，舊資料永遠刪不掉
+    result = session.execute(
+        delete(TokenBlocklist).where(
+            (TokenBlocklist.expires_at <= now)
+            | (TokenBlocklist.expires_at.is_(None) & (TokenBlocklist.created_at <= now - max_lifetime))
+        )
+    )
+    session.commit()
+    return result.rowcount
+
+
+def notify_payload(jti: str, exp: int | None) -> str:
+    return f"{jti}:{exp if exp is not None else ''}"
+
+
+def _handle_notify(payload: str):
+    jti, _, exp = payload.partition(":")
+    revocation_cache.mark_revoked(jti, int(exp) if exp else None)
+
+
+def _connect_listener(engine, probe_interval: float):
+    """LISTEN 專用連線，不經過 pool；開啟 TCP keepalive，半開的連線會在有限時間內丟出錯誤"""
+    cargs, cparams = engine.dialect.create_connect_args(engine.url)
+    seconds = max(1, int(probe_interval))
+    cparams.update(
+        keepalives=1,
+        keepalives_idle=seconds,
+        keepalives_interval=seconds,
+        keepalives_count=3,
+        # 送出的探測查詢超過這段時間沒有 ACK 就視為斷線
+        tcp_user_timeout=seconds * 1000,
+    )
+    return engine.dialect.connect(*cargs, **cparams)
+
+
+def _listen_forever(engine, channel: str, bloom_options: dict):
+    # 放行只靠 Bloom filter 時，斷線最晚要在這段時間內發現 (與 negative TTL 同一個數量級)
+    probe_interval = max(1.0, revocation_cache.negative_ttl / 2)
+    while True:
+        dbapi_conn = None
+        try:
+            dbapi_conn = _connect_listener(engine, probe_interval)
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cur:
+                cur.execute(f'LISTEN "{channel}"')
+            # 重新連線期間可能漏掉通知，放棄所有放行快取
+            revocation_cache.invalidate()
+            # 先 LISTEN 再載入，兩者之間的撤銷不會遺漏
+            if bloom_options["enabled"]:
+                rebuild_bloom(engine, **bloom_options["params"])
+            while True:
+                if (bloom_options["enabled"]
+                        and time.time() - revocation_cache.bloom_built_at > bloom_options["refresh"]):
+                    # 定期重建，讓已過期的 jti 離開 filter
+                    rebuild_bloom(engine, **bloom_options["params"])
+                if select.select([dbapi_conn], [], [], probe_interval) == ([], [], []):
+                    # 沒有通知不代表連線還在：半開的 socket 不會丟錯，主動探測一次
+                    with dbapi_conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                else:
+                    dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    _handle_notify(dbapi_conn.notifies.pop(0).payload)
+        except Exception:
+            # 先停用 Bloom filter 再重連：期間的撤銷通知可能已經遺失
+            revocation_cache.invalidate()
+            logger.exception("token revocation listener failed; reconnecting")
+            time.sleep(5)
+        finally:
+            if dbapi_conn is not None:
+                try:
+                    dbapi_conn.close()
+                except Exception:
+                    pass
+
+
+_listener_pid = None
+
+
+def start_revocation_listener(app, engine):
+    """每個 gunicorn worker (行程) 啟動一條 LISTEN 執行緒"""
+    global _listener_pid
+    revocation_cache.configure(
+        app.config["TOKEN_BLOCKLIST_CACHE_SIZE"],
+        app.config["TOKEN_BLOCKLIST_NEGATIVE_TTL"],
+    )
+    if not app.config["TOKEN_REVOCATION_LISTEN"]:
+        return
+    if engine.dialect.name != "postgresql" or _listener_pid == os.getpid():
+        return
+    _listener_pid = os.getpid()
+    bloom_options = {
+        "enabled": app.config["TOKEN_BLOOM_ENABLED"],
+        "refresh": app.config["TOKEN_BLOOM_REFRESH_SECONDS"],
+        "params": {
+            "max_lifetime": app.config["JWT_REFRESH_TOKEN_EXPIRES"],
+            "capacity": app.config["TOKEN_BLOOM_CAPACITY"],
+            "error_rate": app.config["TOKEN_BLOOM_ERROR_RATE"],
+        },
+    }
+    threading.Thread(
+        target=_listen_forever,
+        args=(engine, app.config["TOKEN_REVOCATION_CHANNEL"], bloom_options),
+        name="token-revocation-listener",
+        daemon=True,
+    ).start()
@@ -0,0 +1,161 @@
+"""餐廳 / 菜單的回應格式：ORM 物件或查詢結果 → 輸出資料只經過這裡一次"""
+from flask import request
+from metrics import timed_call
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+class MenuView:
+    __slots__ = ("id", "restaurant_id", "image_key", "dish_name", "cuisine",
+                 "menu_category", "price", "image_url")
+    FIELDS = ("id", "restaurant_id", "image_key", "dish_name", "cuisine", "menu_category", "price")
+
+    def __init__(self, row):
+        self.id = row.id
+        self.restaurant_id = row.restaurant_id
+        self.image_key = row.image_key
+        self.dish_name = row.dish_name
+        self.cuisine = row.cuisine
+        self.menu_category = row.menu_category
+        self.price = row.price
+        self.image_url = None
+
+    def to_dict(self, with_urls: bool = False) -> dict:
+        data = {
+            "id": self.id,
+            "restaurant_id": self.restaurant_id,
+            "image_key": self.image_key,
+            "dish_name": self.dish_name,
+            "cuisine": self.cuisine,
+            "menu_category": self.menu_category,
+            "price": self.price,
+        }
+        if with_urls:
+            data["image_url"] = self.image_url
+        return data
+
+    def to_row(self, with_urls: bool = False) -> list:
+        row = [self.id, self.restaurant_id, self.image_key, self.dish_name,
+               self.cuisine, self.menu_category, self.price]
+        if with_urls:
+            row.append(self.image_url)
+        return row
+
+
+class SearchResultView(MenuView):
+    __slots__ = ("restaurant_name", "rating")
+    FIELDS = MenuView.FIELDS + ("restaurant_name", "rating")
+
+    def __init__(self, row):
+        super().__init__(row)
+        self.restaurant_name = row.restaurant_name
+        self.rating = row.rating
+
+    def to_dict(self, with_urls: bool = False) -> dict:
+        data = super().to_dict(with_urls)
+        data["restaurant_name"] = self.restaurant_name
+        data["rating"] = self.rating
+        return data
+
+    def to_row(self, with_urls: bool = False) -> list:
+        row = super().to_row(False)
+        row += [self.restaurant_name, self.rating]
+        if with_urls:
+            row.append(self.image_url)
+        return row
+
+
+class RestaurantView:
+    __slots__ = ("id", "restaurant_name", "image_key", "created_at", "updated_at",
+                 "image_url", "menus")
+    FIELDS = ("id", "restaurant_name", "image_key", "created_at", "updated_at")
+
+    def __init__(self, row, menus: list[MenuView] | None = None):
+        self.id = row.id
+        self.restaurant_name = row.restaurant_name
+        self.image_key = row.image_key
+        self.created_at = _iso(row.created_at)
+        self.updated_at = _iso(row.updated_at)
+        self.image_url = None
+        self.menus = menus
+
+    def to_dict(self, with_urls: bool = False) -> dict:
+        data = {
+            "id": self.id,
+            "restaurant_name": self.restaurant_name,
+            "image_key": self.image_key,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if with_urls:
+            data["image_url"] = self.image_url
+        if self.menus is not None:
+            data["menus"] = [m.to_dict(with_urls) for m in self.menus]
+        return data
+
+    def to_row(self, with_urls: bool = False) -> list:
+        row = [self.id, self.restaurant_name, self.image_key, self.created_at, self.updated_at]
+        if with_urls:
+            row.append(self.image_url)
+        if self.menus is not None:
+            row.append([m.to_row(with_urls) for m in self.menus])
+        return row
+
+
+def fields(view_cls, with_urls: bool = False, nested: str | None = None) -> list[str]:
+    """欄位順序與 to_row 相同"""
+    names = list(view_cls.FIELDS)
+    if with_urls:
+        names.append("image_url")
+    if nested:
+        names.append(nested)
+    return names
+
+
+def wants_compact() -> bool:
+    # ?format=compact：欄位名稱只列一次，每筆資料是一個陣列
+    return request.args.get("format") == "compact"
+
+
+@timed_call("serialize")
+def serialize_restaurants(views: list[RestaurantView], compact: bool, with_urls: bool,
+                          with_menus: bool = False) -> dict:
+    """回傳放進回應的 restaurants 欄位 (以及 compact 模式的欄位名稱)"""
+    if not compact:
+        return {"restaurants": [v.to_dict(with_urls) for v in views]}
+    data = {
+        "fields": fields(RestaurantView, with_urls, "menus" if with_menus else None),
+        "restaurants": [v.to_row(with_urls) for v in views],
+    }
+    if with_menus:
+        data["menu_fields"] = fields(MenuView, with_urls)
+    return data
+
+
+@timed_call("serialize")
+def serialize_menus(views: list[MenuView], compact: bool, with_urls: bool,
+                    view_cls=MenuView) -> dict:
+    if not compact:
+        return {"menus": [v.to_dict(with_urls) for v in views]}
+    return {
+        "fields": fields(view_cls, with_urls),
+        "menus": [v.to_row(with_urls) for v in views],
+    }
+
+
+def restaurant_menu_payload(restaurant_name: str, menus: list[MenuView], compact: bool,
+                            with_urls: bool) -> dict:
+    """單一餐廳菜單的回應內容；預先產生的快照也用這裡，兩者格式一致"""
+    data = serialize_menus(menus, compact, with_urls)
+    if not compact:
+        # 舊版格式每道菜都帶餐廳名稱
+        for item in data["menus"]:
+            item["restaurant_name"] = restaurant_name
+    return {
+        "msg": "Menus retrieved successfully",
+        "restaurant_name": restaurant_name,
+        **data,
+        "count": len(menus),
+    }
@@ -0,0 +1,168 @@
+"""增量同步：只回傳某個時間點之後新增、修改、刪除的餐廳與菜單"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required
+from sqlalchemy import and_, delete, exists, func, or_, select, tuple_
+from catalog import MENU_COLUMNS, RESTAURANT_COLUMNS
+from etag import conditional_get
+from image_manager import attach_image_urls, wants_image_urls
+from models import db, CatalogTombstone, Restaurant, RestaurantMenu
+from pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+from schemas import MenuView, RestaurantView, serialize_menus, serialize_restaurants
+
+sync_bp = Blueprint("sync", __name__, url_prefix="/api/sync")
+
+# cursor 內各資料表的進度：None 尚未開始、"done" 已取完、其餘為最後一筆的排序鍵
+_DONE = "done"
+
+
+def _parse_time(raw: str) -> datetime:
+    value = datetime.fromisoformat(raw)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _decode_sync_cursor(token: str):
+    parts = decode_cursor(token)
+    if len(parts) != 5:
+        raise InvalidCursor("invalid cursor")
+    since, until, restaurants_after, menus_after, deleted_after = parts
+    try:
+        since = _parse_time(since) if since is not None else None
+        until = _parse_time(until)
+        positions = []
+        for after in (restaurants_after, menus_after):
+            if after is None or after == _DONE:
+                positions.append(after)
+            else:
+                positions.append((_parse_time(after[0]), uuid.UUID(after[1])))
+        if not (deleted_after is None or deleted_after == _DONE or isinstance(deleted_after, int)):
+            raise InvalidCursor("invalid cursor")
+    except (ValueError, TypeError, IndexError) as e:
+        raise InvalidCursor("invalid cursor") from e
+    return since, until, positions[0], positions[1], deleted_after
+
+
+def _position(rows, has_more: bool, tombstones: bool = False):
+    if not has_more:
+        return _DONE
+    last = rows[-1]
+    return last.id if tombstones else [last.changed_at.isoformat(), str(last.id)]
+
+
+def _changed_rows(model, columns, since, until, after, limit: int):
+    """(updated_at, id) keyset；until 固定在第一頁的時間，翻頁期間的新修改留給下一次同步"""
+    if after == _DONE:
+        return [], False
+    stmt = select(*columns, model.updated_at.label("changed_at")).where(model.updated_at <= until)
+    if since is not None:
+        stmt = stmt.where(model.updated_at >= since)
+    if after is not None:
+        stmt = stmt.where(tuple_(model.updated_at, model.id) > tuple_(*after))
+    rows = db.session.execute(stmt.order_by(model.updated_at, model.id).limit(limit + 1)).all()
+    return rows[:limit], len(rows) > limit
+
+
+def _deleted_rows(since, until, after, limit: int):
+    # 第一次完整同步不需要刪除紀錄
+    if since is None or after == _DONE:
+        return [], False
+    t = CatalogTombstone
+    stmt = select(t.id, t.entity, t.entity_id, t.restaurant_id, t.deleted_at).where(
+        t.deleted_at >= since,
+        t.deleted_at <= until,
+        # 以相同 id 重新匯入的資料已經在新增 / 修改名單中
+        or_(
+            and_(t.entity == "restaurant", ~exists().where(Restaurant.id == t.entity_id)),
+            and_(t.entity == "menu", ~exists().where(RestaurantMenu.id == t.entity_id)),
+        ),
+    )
+    if after is not None:
+        stmt = stmt.where(t.id > after)
+    rows = db.session.execute(stmt.order_by(t.id).limit(limit + 1)).all()
+    return rows[:limit], len(rows) > limit
+
+
+def prune_tombstones(session, retention: timedelta) -> int:
+    cutoff = datetime.now(timezone.utc) - retention
+    result = session.execute(delete(CatalogTombstone).where(CatalogTombstone.deleted_at < cutoff))
+    session.commit()
+    return result.rowcount
+
+
+@sync_bp.route("/catalog", methods=["GET"])
+@jwt_required()
+@conditional_get()
+def catalog_changes():
+    # ?since=<watermark>&limit=&cursor=；不帶 since 時從頭完整下載
+    try:
+        limit = parse_limit(
+            request.args.get("limit"),
+            current_app.config["CATALOG_SYNC_PAGE_SIZE"],
+            current_app.config["CATALOG_SYNC_PAGE_SIZE_MAX"],
+        )
+    except ValueError:
+        return jsonify({"msg": "limit must be a positive integer"}), 400
+
+    cursor = request.args.get("cursor")
+    try:
+        if cursor:
+            try:
+                since, until, restaurants_after, menus_after, deleted_after = _decode_sync_cursor(cursor)
+            except InvalidCursor:
+                return jsonify({"msg": "Invalid cursor"}), 400
+        else:
+            since = None
+            if request.args.get("since"):
+                try:
+                    since = _parse_time(request.args["since"])
+                except ValueError:
+                    return jsonify({"msg": "since must be an ISO 8601 datetime"}), 400
+            until = db.session.execute(select(func.now())).scalar()
+            restaurants_after = menus_after = deleted_after = None
+
+        retention = timedelta(days=current_app.config["CATALOG_TOMBSTONE_RETENTION_DAYS"])
+        if since is not None and since < until - retention:
+            # 刪除紀錄已被清掉，無法保證完整
+            return jsonify({"msg": "since is older than the sync window, download the full catalog again"}), 410
+
+        restaurant_rows, more_restaurants = _changed_rows(
+            Restaurant, RESTAURANT_COLUMNS, since, until, restaurants_after, limit)
+        menu_rows, more_menus = _changed_rows(
+            RestaurantMenu, MENU_COLUMNS, since, until, menus_after, limit)
+        deleted_rows, more_deleted = _deleted_rows(since, until, deleted_after, limit)
+
+        restaurants = [RestaurantView(r) for r in restaurant_rows]
+        menus = [MenuView(r) for r in menu_rows]
+        with_urls = wants_image_urls()
+        if with_urls:
+            attach_image_urls(restaurants + menus)
+
+        next_cursor = None
+        if more_restaurants or more_menus or more_deleted:
+            next_cursor = encode_cursor(
+                since, until,
+                _position(restaurant_rows, more_restaurants),
+                _position(menu_rows, more_menus),
+                _position(deleted_rows, more_deleted, tombstones=True),
+            )
+
+        watermark = until - timedelta(seconds=current_app.config["CATALOG_SYNC_OVERLAP_SECONDS"])
+        return jsonify({
+            "msg": "Changes retrieved successfully",
+            **serialize_restaurants(restaurants, False, with_urls),
+            **serialize_menus(menus, False, with_urls),
+            "deleted": [
+                {"type": row.entity, "id": row.entity_id, "restaurant_id": row.restaurant_id,
+                 "deleted_at": row.deleted_at.isoformat()}
+                for row in deleted_rows
+            ],
+            # 取完所有頁之後，下次同步帶 ?since=<watermark>
+            "watermark": watermark.isoformat(),
+            "next_cursor": next_cursor,
+        }), 200
+
+    except Exception as e:
+        return jsonify({"msg": "Error retrieving changes", "error": str(e)}), 500
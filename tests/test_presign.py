@@ -0,0 +1,72 @@
+"""SigV4Presigner 與 boto3 generate_presigned_url 在固定時間下必須產生完全相同的 URL"""
+import datetime
+from unittest import mock
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+import botocore.auth  # noqa: E402
+
+from presign import SigV4Presigner  # noqa: E402
+
+ACCESS_KEY = "AKIDEXAMPLE"
+SECRET_KEY = "secret/+key=example"
+BUCKET = "food-images"
+EXPIRES_IN = 900
+SIGNED_AT = datetime.datetime(2026, 10, 18, 11, 15, 47)
+
+KEYS = [
+    "plain.png",
+    "restaurants/a b c.png",
+    "餐廳/牛肉麵.jpg",
+    "x+y=z&q?.png",
+    "~tilde/!*'()",
+    "percent%20.png",
+    "slash//double",
+    "/leading",
+]
+
+ENDPOINTS = [
+    "https://acct123.r2.cloudflarestorage.com",
+    "https://acct123.r2.cloudflarestorage.com:443",
+    "http://localhost:9000",
+    "https://s3.example.com:8443",
+]
+
+OPERATIONS = [("GET", "get_object"), ("PUT", "put_object"), ("DELETE", "delete_object")]
+
+
+class _FrozenDatetime(datetime.datetime):
+    @classmethod
+    def utcnow(cls):
+        return SIGNED_AT
+
+    @classmethod
+    def now(cls, tz=None):
+        return SIGNED_AT if tz is None else SIGNED_AT.replace(tzinfo=tz)
+
+
+@pytest.fixture
+def frozen_clock():
+    with mock.patch.object(botocore.auth.datetime, "datetime", _FrozenDatetime):
+        yield SIGNED_AT.replace(tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+@pytest.mark.parametrize("method,operation", OPERATIONS)
+def test_presign_matches_boto3(frozen_clock, endpoint, method, operation):
+    s3 = boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=ACCESS_KEY,
+        aws_secret_access_key=SECRET_KEY,
+        region_name="auto",
+    )
+    presigner = SigV4Presigner(ACCESS_KEY, SECRET_KEY, endpoint, BUCKET, "auto")
+
+    expected = [
+        s3.generate_presigned_url(operation, Params={"Bucket": BUCKET, "Key": key}, ExpiresIn=EXPIRES_IN)
+        for key in KEYS
+    ]
+    assert presigner.presign_many(method, KEYS, EXPIRES_IN, now=frozen_clock) == expected
+    assert presigner.presign(method, KEYS[2], EXPIRES_IN, now=frozen_clock) == expected[2]
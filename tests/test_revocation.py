@@ -0,0 +1,36 @@
+"""prune_expired 只刪掉已失效的 blocklist 資料，包含沒有 expires_at 的舊資料"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from models import TokenBlocklist
+from revocation import prune_expired
+
+MAX_LIFETIME = timedelta(days=30)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    TokenBlocklist.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def test_prune_expired(session):
+    now = datetime.now(timezone.utc)
+    session.add_all([
+        TokenBlocklist("expired", now - timedelta(days=2), now - timedelta(days=1)),
+        TokenBlocklist("live", now - timedelta(days=2), now + timedelta(days=1)),
+        # 舊資料沒有 expires_at：超過 refresh token 最長效期才刪
+        TokenBlocklist("legacy-old", now - MAX_LIFETIME - timedelta(days=1)),
+        TokenBlocklist("legacy-recent", now - timedelta(days=1)),
+    ])
+    session.commit()
+
+    assert prune_expired(session, MAX_LIFETIME) == 2
+    remaining = session.execute(select(TokenBlocklist.jti).order_by(TokenBlocklist.jti)).scalars().all()
+    assert remaining == ["legacy-recent", "live"]